@@ -1,8 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    render_template,
+    request,
+    redirect,
+    stream_with_context,
+    url_for,
+    flash,
+)
 from flask_login import login_required, current_user
 from functools import wraps
-from models import Product, Category, User, Order
+from datetime import date, datetime, timedelta
+import shutil
+import tempfile
+from models import Product, Category, User, Order, PRODUCT_SORTS
+from extensions import gather
 from werkzeug.security import generate_password_hash
+from itsdangerous import BadSignature, URLSafeSerializer
+import product_io
+import reports
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -22,25 +39,15 @@ def admin_required(f):
 @login_required
 @admin_required
 def dashboard():
-    # Counters might be inefficient via API if table is large.
-    # Supabase allows 'count' in select with head=True for efficiency.
-    # For now, fetching all is okay for small scale.
+    # Counts use PostgREST head requests and the revenue/status breakdown is
+    # aggregated in Postgres, so no table rows travel over the wire.
     try:
-        products = Product.get_all()
-        products_count = len(products) if products else 0
-
-        # We don't have a get_all for users in the basic model yet, let's add simple count or fetch
-        # For this demo, we might skip precise counts or implement specific methods if needed.
-        # Assuming we can just count what we can fetch:
-
-        categories = Category.get_all()
-        categories_count = len(categories) if categories else 0
-
-        orders = Order.get_all()
-        orders_count = len(orders) if orders else 0
-
-        users = User.get_all()
-        users_count = len(users) if users else 0
+        products_count, categories_count, orders_count, users_count, order_stats = (
+            gather(Product.count, Category.count, Order.count, User.count, Order.stats)
+        )
+        revenue = sum(
+            float(row["revenue"]) for row in order_stats if row["status"] != "cancelled"
+        )
 
         return render_template(
             "admin/dashboard.html",
@@ -48,6 +55,8 @@ def dashboard():
             users_count=users_count,
             orders_count=orders_count,
             categories_count=categories_count,
+            revenue=revenue,
+            order_stats=order_stats,
         )
     except Exception as e:
         flash(f"Error cargando dashboard: {e}", "danger")
@@ -57,6 +66,8 @@ def dashboard():
             users_count=0,
             orders_count=0,
             categories_count=0,
+            revenue=0,
+            order_stats=[],
         )
 
 
@@ -65,8 +76,19 @@ def dashboard():
 @login_required
 @admin_required
 def products_list():
-    products = Product.get_all()
-    return render_template("admin/products.html", products=products)
+    sort = request.args.get("sort")
+    if sort not in PRODUCT_SORTS:
+        sort = None
+    products, next_cursor = Product.page(
+        request.args.get("cursor"), current_app.config["ADMIN_PAGE_SIZE"], sort
+    )
+    return render_template(
+        "admin/products.html",
+        products=products,
+        next_cursor=next_cursor,
+        sort=sort,
+        sorts=PRODUCT_SORTS,
+    )
 
 
 @admin_bp.route("/product/new", methods=["GET", "POST"])
@@ -139,6 +161,180 @@ def delete_product(id):
     return redirect(url_for("admin.products_list"))
 
 
+@admin_bp.route("/products/import", methods=["GET", "POST"])
+@login_required
+@admin_required
+def products_import():
+    if request.method == "GET":
+        return render_template("admin/product_import.html")
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Selecciona un archivo CSV, JSON Lines o JSON.", "danger")
+        return redirect(url_for("admin.products_import"))
+    fmt = request.form.get("format") or product_io.detect_format(upload.filename)
+    if fmt not in product_io.IMPORT_FORMATS:
+        flash("Formato no soportado.", "danger")
+        return redirect(url_for("admin.products_import"))
+
+    # Flask closes uploads once the view returns, before the response streams
+    source = tempfile.TemporaryFile()
+    shutil.copyfileobj(upload.stream, source)
+    source.seek(0)
+    progress = product_io.import_products(
+        source,
+        fmt,
+        batch_size=current_app.config["IMPORT_BATCH_SIZE"],
+        concurrency=current_app.config["IMPORT_CONCURRENCY"],
+    )
+
+    # Progress lines are streamed as each round of batches is written
+    def generate():
+        report = None
+        with source:
+            for report in progress:
+                yield (
+                    f"Procesadas {report.processed} filas: "
+                    f"{report.written} guardadas, {report.error_count} con errores "
+                    f"({report.rate:.0f} filas/s)\n"
+                )
+        yield "\nImportación terminada.\n"
+        for line, message in report.errors:
+            where = f"Línea {line}" if line else "Archivo"
+            yield f"{where}: {message}\n"
+        hidden = report.error_count - len(report.errors)
+        if hidden:
+            yield f"... y {hidden} errores más.\n"
+
+    return Response(
+        stream_with_context(generate()), mimetype="text/plain; charset=utf-8"
+    )
+
+
+@admin_bp.route("/products/export")
+@login_required
+@admin_required
+def products_export():
+    fmt = request.args.get("format", "csv")
+    if fmt not in product_io.FORMATS:
+        fmt = "csv"
+    filename = f"productos-{datetime.now():%Y%m%d}.{fmt}"
+    return Response(
+        stream_with_context(product_io.export_products(fmt)),
+        mimetype=product_io.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+PRICE_MODES = {
+    "percent": "Variar en porcentaje (%)",
+    "amount": "Sumar o restar un monto",
+    "set": "Fijar un precio",
+}
+STOCK_MODES = {"add": "Sumar o restar unidades", "set": "Fijar el stock"}
+
+
+def _bulk_request(form):
+    """Filters and changes of the bulk-adjust form; ValueError if invalid."""
+    filters = {}
+    if form.get("search"):
+        filters["search"] = form["search"].strip()
+    try:
+        if form.get("category_id"):
+            filters["category_id"] = int(form["category_id"])
+        for key in ("min_price", "max_price"):
+            if form.get(key):
+                filters[key] = float(form[key])
+    except ValueError:
+        raise ValueError("Filtro de categoría o precio inválido.")
+    if form.get("is_offer") in ("1", "0"):
+        filters["is_offer"] = form["is_offer"] == "1"
+
+    changes = {}
+    price_mode = form.get("price_mode")
+    if price_mode in PRICE_MODES:
+        try:
+            price_value = float(form.get("price_value", ""))
+        except ValueError:
+            raise ValueError("Indica el valor del cambio de precio.")
+        if price_mode == "percent" and price_value <= -100:
+            raise ValueError("El porcentaje debe ser mayor que -100.")
+        if price_mode == "set" and price_value < 0:
+            raise ValueError("El precio no puede ser negativo.")
+        changes.update(price_mode=price_mode, price_value=price_value)
+    stock_mode = form.get("stock_mode")
+    if stock_mode in STOCK_MODES:
+        try:
+            stock_value = int(form.get("stock_value", ""))
+        except ValueError:
+            raise ValueError("Indica las unidades de stock.")
+        if stock_mode == "set" and stock_value < 0:
+            raise ValueError("El stock no puede ser negativo.")
+        changes.update(stock_mode=stock_mode, stock_value=stock_value)
+    if form.get("set_offer") in ("1", "0"):
+        changes["is_offer"] = form["set_offer"] == "1"
+    if not changes:
+        raise ValueError("Indica al menos un cambio de precio, stock u oferta.")
+    return filters, changes
+
+
+def _preview_serializer():
+    return URLSafeSerializer(current_app.secret_key, salt="products-bulk-preview")
+
+
+def _previewed(form, filters, changes):
+    """Count signed into the form by the preview, if it was for this request."""
+    try:
+        preview = _preview_serializer().loads(form.get("preview", ""))
+    except BadSignature:
+        return None
+    if preview.get("filters") != filters or preview.get("changes") != changes:
+        return None
+    return preview.get("count")
+
+
+@admin_bp.route("/products/bulk", methods=["GET", "POST"])
+@login_required
+@admin_required
+def products_bulk():
+    matched, sample, preview = None, [], None
+    if request.method == "POST":
+        try:
+            filters, changes = _bulk_request(request.form)
+        except ValueError as e:
+            flash(str(e), "danger")
+        else:
+            # Preview: the same statement, counting instead of writing
+            matched, sample = Product.bulk_adjust(filters, changes)
+            if request.form.get("action") == "apply":
+                # Apply only what was previewed: same filters and changes,
+                # and still the same number of products
+                expected = _previewed(request.form, filters, changes)
+                if expected is not None and expected == matched:
+                    count, _ = Product.bulk_adjust(filters, changes, dry_run=False)
+                    flash(f"{count} productos actualizados.", "success")
+                    return redirect(url_for("admin.products_list"))
+                flash(
+                    "El filtro, los cambios o los productos afectados cambiaron "
+                    "desde la vista previa. Revísala y vuelve a aplicar.",
+                    "warning",
+                )
+            preview = _preview_serializer().dumps(
+                {"filters": filters, "changes": changes, "count": matched}
+            )
+
+    return render_template(
+        "admin/product_bulk.html",
+        categories=Category.get_all(),
+        form=request.form,
+        matched=matched,
+        sample=sample,
+        preview=preview,
+        price_modes=PRICE_MODES,
+        stock_modes=STOCK_MODES,
+    )
+
+
 # --- Categories Management ---
 @admin_bp.route("/categories")
 @login_required
@@ -190,8 +386,43 @@ def delete_category(id):
 @login_required
 @admin_required
 def orders_list():
-    orders = Order.get_all()
-    return render_template("admin/orders.html", orders=orders)
+    orders, next_cursor = Order.page(
+        request.args.get("cursor"), current_app.config["ADMIN_PAGE_SIZE"]
+    )
+    today = date.today()
+    return render_template(
+        "admin/orders.html",
+        orders=orders,
+        next_cursor=next_cursor,
+        reports={key: report[0] for key, report in reports.REPORTS.items()},
+        export_start=today.replace(month=1, day=1),
+        export_end=today,
+    )
+
+
+@admin_bp.route("/orders/export")
+@login_required
+@admin_required
+def orders_export():
+    report = request.args.get("report", "orders")
+    try:
+        start = date.fromisoformat(request.args.get("start", ""))
+        end = date.fromisoformat(request.args.get("end", ""))
+    except ValueError:
+        start = end = None
+    if report not in reports.REPORTS or start is None or end < start:
+        flash("Indica un reporte y un rango de fechas válido.", "danger")
+        return redirect(url_for("admin.orders_list"))
+
+    # Rows are fetched page by page while the response streams; the end date
+    # is inclusive
+    rows = reports.export(report, start.isoformat(), (end + timedelta(1)).isoformat())
+    filename = f"{report}-{start}_{end}.csv"
+    return Response(
+        stream_with_context(rows),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @admin_bp.route("/order/<int:order_id>", methods=["GET", "POST"])
@@ -212,8 +443,10 @@ def order_detail(order_id):
 @login_required
 @admin_required
 def users_list():
-    users = User.get_all()
-    return render_template("admin/users.html", users=users)
+    users, next_cursor = User.page(
+        request.args.get("cursor"), current_app.config["ADMIN_PAGE_SIZE"]
+    )
+    return render_template("admin/users.html", users=users, next_cursor=next_cursor)
 
 
 @admin_bp.route("/user/new", methods=["GET", "POST"])
@@ -1,8 +1,21 @@
 import os
 from flask import Flask
 from config import Config
-from extensions import login_manager
-from models import User, Product, Cart
+from extensions import login_manager, http_transport
+from cache import (
+    catalog_cache,
+    cart_cache,
+    page_cache,
+    catalog_version,
+    listing_version,
+    cached_fragment,
+)
+from search_index import suggest_index
+from catalog import catalog_snapshot
+from http_cache import static_fingerprints
+from metrics import metrics
+from profiler import request_profiler
+from models import User, Cart
 from flask_login import current_user
 
 
@@ -12,6 +25,20 @@ def create_app(config_class=Config):
 
     # Initialize extensions
     login_manager.init_app(app)
+    catalog_cache.init_app(app, "CATALOG_CACHE")
+    cart_cache.init_app(app, "CART_CACHE")
+    page_cache.init_app(app, "PAGE_CACHE")
+    catalog_version.init_app(app)
+    listing_version.init_app(app)
+    app.add_template_global(cached_fragment)
+    suggest_index.init_app(app)
+    catalog_snapshot.init_app(app)
+    static_fingerprints.init_app(app)
+    metrics.init_app(app, http_transport)
+    metrics.add_source("catalog_cache", catalog_cache.stats)
+    metrics.add_source("cart_cache", cart_cache.stats)
+    metrics.add_source("page_cache", page_cache.stats)
+    request_profiler.init_app(app)
 
     # User loader callback for Flask-Login
     @login_manager.user_loader
@@ -21,12 +48,7 @@ def create_app(config_class=Config):
     @app.context_processor
     def inject_cart_count():
         if current_user.is_authenticated:
-            cart = Cart.get_user_cart(current_user.id)
-            count = (
-                sum(item["quantity"] for item in cart["items"])
-                if cart and cart["items"]
-                else 0
-            )
+            count = Cart.count(current_user.id)
         else:
             count = 0
         return {"cart_count": count}
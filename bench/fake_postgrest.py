@@ -0,0 +1,953 @@
+"""In-process stand-in for the Supabase PostgREST API.
+
+``FakePostgREST`` is an ``httpx`` transport that answers the requests the app
+sends through supabase-py from in-memory tables: column selection with
+embedded resources, the filter/order/limit grammar, exact counts, inserts,
+upserts, updates, deletes, and Python ports of the RPC functions in
+``supabase_schema.sql``. Every call can be delayed by an injected latency
+and is counted per benchmark route.
+"""
+
+import bisect
+import contextvars
+import heapq
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl
+
+import httpx
+
+from search_index import normalize
+
+# Route being measured; fan-out threads inherit it through copied contexts
+current_route = contextvars.ContextVar("bench_route", default=None)
+
+UUID_TABLES = {"users", "carts"}
+
+# Column defaults applied on insert (mirrors supabase_schema.sql)
+DEFAULTS = {
+    "users": {"is_admin": False},
+    "categories": {},
+    "products": {
+        "description": None,
+        "image_url": None,
+        "category_id": None,
+        "is_offer": False,
+        "stock": 0,
+    },
+    "carts": {},
+    "cart_items": {"quantity": 1},
+    "orders": {"status": "pending"},
+    "order_items": {},
+    "order_shipping": {"notes": None},
+    "payments": {"status": "paid", "transaction_ref": None},
+}
+TIMESTAMPS = {
+    "users": ("created_at",),
+    "products": ("created_at",),
+    "carts": ("created_at", "updated_at"),
+    "cart_items": ("added_at",),
+    "orders": ("created_at",),
+    "order_shipping": ("created_at",),
+    "payments": ("created_at",),
+}
+
+# Hash indexes for the columns the app filters and embeds on
+INDEXED = {
+    "users": ("email",),
+    "products": ("category_id",),
+    "carts": ("user_id",),
+    "cart_items": ("cart_id", "product_id"),
+    "orders": ("user_id",),
+    "order_items": ("order_id",),
+    "order_shipping": ("order_id",),
+    "payments": ("order_id",),
+}
+
+# (table, embedded name) -> (cardinality, target table, local column, target column)
+RELATIONS = {
+    ("products", "categories"): ("one", "categories", "category_id", "id"),
+    ("categories", "products"): ("many", "products", "id", "category_id"),
+    ("carts", "cart_items"): ("many", "cart_items", "id", "cart_id"),
+    ("cart_items", "products"): ("one", "products", "product_id", "id"),
+    ("cart_items", "carts"): ("one", "carts", "cart_id", "id"),
+    ("orders", "users"): ("one", "users", "user_id", "id"),
+    ("orders", "order_items"): ("many", "order_items", "id", "order_id"),
+    ("orders", "order_shipping"): ("one", "order_shipping", "id", "order_id"),
+    ("order_items", "orders"): ("one", "orders", "order_id", "id"),
+    ("order_items", "products"): ("one", "products", "product_id", "id"),
+}
+
+# ON DELETE CASCADE / SET NULL
+ON_DELETE = {
+    "users": [("carts", "user_id", "cascade"), ("orders", "user_id", "null")],
+    "categories": [("products", "category_id", "null")],
+    "products": [("cart_items", "product_id", "cascade")],
+    "carts": [("cart_items", "cart_id", "cascade")],
+    "orders": [
+        ("order_items", "order_id", "cascade"),
+        ("order_shipping", "order_id", "cascade"),
+        ("payments", "order_id", "cascade"),
+    ],
+}
+
+UNIQUE = {
+    "users": ("email",),
+    "categories": ("slug",),
+    "carts": ("user_id",),
+    "cart_items": ("cart_id", "product_id"),
+    "order_shipping": ("order_id",),
+}
+
+
+class PostgrestError(Exception):
+    def __init__(self, message, code="P0001", status=400):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.status = status
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Table:
+    """Rows by primary key plus hash indexes on ``INDEXED`` columns."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = {}
+        self.next_id = 1
+        self.indexes = {column: defaultdict(dict) for column in INDEXED.get(name, ())}
+
+    def lookup(self, column, value):
+        if column == "id":
+            row = self.rows.get(value)
+            return [row] if row is not None else []
+        index = self.indexes.get(column)
+        if index is None:
+            return [r for r in self.rows.values() if r.get(column) == value]
+        return list(index.get(value, {}).values())
+
+    def insert(self, row):
+        if "id" not in row:
+            if self.name in UUID_TABLES:
+                row["id"] = str(uuid.uuid4())
+            else:
+                row["id"] = self.next_id
+        if isinstance(row["id"], int):
+            self.next_id = max(self.next_id, row["id"] + 1)
+        self.rows[row["id"]] = row
+        for column, index in self.indexes.items():
+            index[row.get(column)][row["id"]] = row
+        return row
+
+    def update(self, row, changes):
+        for column, index in self.indexes.items():
+            if column in changes and changes[column] != row.get(column):
+                index[row.get(column)].pop(row["id"], None)
+                index[changes[column]][row["id"]] = row
+        row.update(changes)
+        return row
+
+    def delete(self, row):
+        self.rows.pop(row["id"], None)
+        for column, index in self.indexes.items():
+            index[row.get(column)].pop(row["id"], None)
+
+
+# --- Query grammar ---------------------------------------------------------
+
+
+def _split(text):
+    """Split on top-level commas, respecting parentheses and double quotes."""
+    parts, depth, quoted, start, i = [], 0, False, 0, 0
+    while i < len(text):
+        c = text[i]
+        if quoted:
+            if c == "\\":
+                i += 1
+            elif c == '"':
+                quoted = False
+        elif c == '"':
+            quoted = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+        i += 1
+    tail = text[start:].strip()
+    if tail:
+        parts.append(tail)
+    return parts
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def parse_select(text):
+    """``"id, categories(name)"`` -> ``(columns, {embed: (inner, subselect)})``."""
+    columns, embeds = [], {}
+    for item in _split(text or "*"):
+        if "(" in item:
+            head, sub = item.split("(", 1)
+            name, _, hint = head.partition("!")
+            embeds[name.strip()] = (hint == "inner", parse_select(sub[:-1]))
+        elif item:
+            columns.append(item)
+    return columns, embeds
+
+
+def parse_condition(column, expression):
+    """``("price", "gte.10")`` -> predicate over a row."""
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, raw = expression.partition(".")
+    if op in ("or", "and"):
+        predicate = parse_logic(op, raw)
+    else:
+        predicate = _comparison(column, op, raw)
+    return (lambda row: not predicate(row)) if negate else predicate
+
+
+def parse_logic(op, text):
+    """``or=(a.eq.1,and(b.gt.2,c.lt.3))`` -> predicate over a row."""
+    text = text.strip()
+    if text.startswith("(") and text.endswith(")"):
+        text = text[1:-1]
+    predicates = []
+    for part in _split(text):
+        for nested in ("and", "or", "not.and", "not.or"):
+            if part.startswith(nested + "("):
+                negated = nested.startswith("not.")
+                inner = parse_logic(nested.split(".")[-1], part[len(nested) :])
+                predicates.append(
+                    (lambda row, p=inner: not p(row)) if negated else inner
+                )
+                break
+        else:
+            column, _, expression = part.partition(".")
+            predicates.append(parse_condition(column, expression))
+    if op == "and":
+        return lambda row: all(p(row) for p in predicates)
+    return lambda row: any(p(row) for p in predicates)
+
+
+def _coerce(raw, sample):
+    if isinstance(sample, bool):
+        return raw.lower() in ("true", "t", "1")
+    if isinstance(sample, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return float(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _comparison(column, op, raw):
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}[raw.lower()]
+        return lambda row: row.get(column) is expected
+    if op == "in":
+        values = [_unquote(v) for v in _split(raw.strip("()"))]
+        return lambda row: row.get(column) is not None and row[column] in [
+            _coerce(v, row[column]) for v in values
+        ]
+    raw = _unquote(raw)
+    if op in ("like", "ilike"):
+        pattern = raw.replace("*", "%")
+        return lambda row: _like(row.get(column), pattern, op == "ilike")
+    compare = {
+        "eq": lambda a, b: a == b,
+        "neq": lambda a, b: a != b,
+        "gt": lambda a, b: a > b,
+        "gte": lambda a, b: a >= b,
+        "lt": lambda a, b: a < b,
+        "lte": lambda a, b: a <= b,
+    }[op]
+
+    def predicate(row):
+        value = row.get(column)
+        if value is None:
+            return False
+        return compare(value, _coerce(raw, value))
+
+    return predicate
+
+
+def _like(value, pattern, insensitive):
+    if value is None:
+        return False
+    if insensitive:
+        value, pattern = value.lower(), pattern.lower()
+    parts = pattern.split("%")
+    if not value.startswith(parts[0]) or not value.endswith(parts[-1]):
+        return False
+    position = len(parts[0])
+    for part in parts[1:-1]:
+        position = value.find(part, position)
+        if position < 0:
+            return False
+        position += len(part)
+    return len(value) - len(parts[-1]) >= position
+
+
+def parse_order(text):
+    order = []
+    for item in _split(text):
+        column, *modifiers = item.split(".")
+        order.append((column, "desc" in modifiers))
+    return order
+
+
+class _Reversed:
+    """Inverts comparisons so mixed-direction orders share one sort key."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _sort_key(order):
+    def key(row):
+        parts = []
+        for column, desc in order:
+            value = row.get(column)
+            # Postgres puts NULLs last ascending and first descending
+            part = (value is None, value if value is not None else 0)
+            parts.append(_Reversed(part) if desc else part)
+        return tuple(parts)
+
+    return key
+
+
+def order_rows(rows, order, limit=None):
+    if not order:
+        return rows[:limit] if limit is not None else rows
+    key = _sort_key(order)
+    if limit is not None and limit < len(rows) // 4:
+        return heapq.nsmallest(limit, rows, key=key)
+    ordered = sorted(rows, key=key)
+    return ordered[:limit] if limit is not None else ordered
+
+
+# --- Transport -------------------------------------------------------------
+
+
+class FakePostgREST(httpx.BaseTransport):
+    """Answers ``/rest/v1`` requests from in-memory tables.
+
+    ``latency`` (seconds, plus up to ``jitter``) is slept per request to model
+    the network round-trip; ``calls`` counts requests per route and
+    ``(method, table)``.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tables = {name: Table(name) for name in DEFAULTS}
+        self.calls = defaultdict(Counter)
+        self.server_time = defaultdict(float)
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._search_words = {}
+
+    # -- httpx ---------------------------------------------------------------
+
+    def handle_request(self, request):
+        delay = self.latency + (self._random.random() * self.jitter)
+        if delay:
+            time.sleep(delay)
+        path = request.url.path.split("/rest/v1/", 1)[-1]
+        params = parse_qsl(request.url.query.decode(), keep_blank_values=True)
+        prefer = request.headers.get("prefer", "")
+        body = json.loads(request.content) if request.content else None
+        label = f"{request.method} {path}"
+
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                status, data, headers = self._dispatch(
+                    request.method, path, params, prefer, body
+                )
+        except PostgrestError as e:
+            status, headers = e.status, {}
+            data = {"code": e.code, "message": e.message, "details": None, "hint": None}
+        finally:
+            route = current_route.get()
+            self.calls[route][label] += 1
+            self.server_time[route] += time.perf_counter() - started
+
+        content = b"" if request.method == "HEAD" else json.dumps(data).encode()
+        headers = {"content-type": "application/json", **headers}
+        return httpx.Response(status, headers=headers, content=content)
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.server_time.clear()
+
+    def _dispatch(self, method, path, params, prefer, body):
+        if path.startswith("rpc/"):
+            return self._rpc(path[4:], params, body or {})
+        table = self.tables.get(path)
+        if table is None:
+            raise PostgrestError(f"relation {path} does not exist", "42P01", 404)
+        if method in ("GET", "HEAD"):
+            return self._select(table, params, prefer)
+        if method == "POST":
+            return self._insert(table, params, prefer, body)
+        if method == "PATCH":
+            return self._update(table, params, body)
+        if method == "DELETE":
+            return self._delete(table, params)
+        raise PostgrestError(f"method {method} not supported", "PGRST", 405)
+
+    # -- reads ---------------------------------------------------------------
+
+    def _split_params(self, params):
+        """Top-level filters, modifiers and per-embed parameters."""
+        filters, modifiers, embedded = [], {}, defaultdict(list)
+        for key, value in params:
+            if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+                modifiers[key] = value
+            elif "." in key and key.split(".")[-1] in ("limit", "order", "offset"):
+                embed, _, modifier = key.rpartition(".")
+                embedded[embed].append((modifier, value))
+            elif "." in key and key not in ("or", "and"):
+                embed, _, column = key.rpartition(".")
+                embedded[embed].append((column, value))
+            else:
+                filters.append((key, value))
+        return filters, modifiers, embedded
+
+    def _candidates(self, table, filters):
+        # Use a primary key or hash index for a top-level eq filter if there is one
+        for column, expression in filters:
+            if expression.startswith("eq.") and (
+                column == "id" or column in table.indexes
+            ):
+                raw = _unquote(expression[3:])
+                # Integer keys are serial ids; UUIDs and emails stay strings
+                key = int(raw) if raw.lstrip("-").isdigit() else raw
+                return table.lookup(column, key)
+        return list(table.rows.values())
+
+    def query(self, table, params):
+        """Rows of ``table`` for PostgREST ``params`` plus the unpaged count."""
+        filters, modifiers, embedded = self._split_params(params)
+        columns, embeds = parse_select(modifiers.get("select", "*"))
+
+        rows = self._candidates(table, filters)
+        predicates = [
+            (
+                parse_logic(key, value)
+                if key in ("or", "and")
+                else parse_condition(key, value)
+            )
+            for key, value in filters
+        ]
+        rows = [r for r in rows if all(p(r) for p in predicates)]
+
+        # !inner embeds filter the parent on the embedded filters
+        for name, (inner, _) in embeds.items():
+            if inner:
+                rows = [r for r in rows if self._embed(table, r, name, embedded)]
+
+        count = len(rows)
+        offset = int(modifiers.get("offset", 0))
+        limit = int(modifiers["limit"]) if "limit" in modifiers else None
+        order = parse_order(modifiers["order"]) if "order" in modifiers else None
+        if offset or limit is not None:
+            rows = order_rows(rows, order, None if limit is None else offset + limit)
+            rows = rows[offset:]
+        else:
+            rows = order_rows(rows, order)
+        return [self._project(table, r, columns, embeds, embedded) for r in rows], count
+
+    def _embed(self, table, row, name, embedded):
+        cardinality, target, local, remote = RELATIONS[(table.name, name)]
+        target_table = self.tables[target]
+        matches = (
+            target_table.lookup(remote, row.get(local))
+            if row.get(local) is not None
+            else []
+        )
+        predicates = [
+            parse_condition(column, value)
+            for column, value in embedded.get(name, [])
+            if column not in ("limit", "order", "offset")
+        ]
+        matches = [m for m in matches if all(p(m) for p in predicates)]
+        if cardinality == "one":
+            return matches[0] if matches else None
+        return matches
+
+    def _project(self, table, row, columns, embeds, embedded):
+        if "*" in columns:
+            out = dict(row)
+        else:
+            out = {c: row.get(c) for c in columns}
+        for name, (_, (sub_columns, sub_embeds)) in embeds.items():
+            cardinality, target, _, _ = RELATIONS[(table.name, name)]
+            target_table = self.tables[target]
+            value = self._embed(table, row, name, embedded)
+            if cardinality == "one":
+                out[name] = (
+                    None
+                    if value is None
+                    else self._project(target_table, value, sub_columns, sub_embeds, {})
+                )
+            else:
+                modifiers = dict(
+                    (k, v) for k, v in embedded.get(name, []) if k in ("limit", "order")
+                )
+                order = (
+                    parse_order(modifiers["order"]) if "order" in modifiers else None
+                )
+                limit = int(modifiers["limit"]) if "limit" in modifiers else None
+                value = order_rows(value, order or [("id", False)], limit)
+                out[name] = [
+                    self._project(target_table, v, sub_columns, sub_embeds, {})
+                    for v in value
+                ]
+        return out
+
+    def _select(self, table, params, prefer):
+        rows, count = self.query(table, params)
+        headers = {}
+        if "count=" in prefer:
+            end = max(len(rows) - 1, 0)
+            headers["content-range"] = f"0-{end}/{count}"
+        return 200, rows, headers
+
+    # -- writes --------------------------------------------------------------
+
+    def insert_row(self, table, values):
+        row = dict(DEFAULTS[table.name])
+        for column in TIMESTAMPS.get(table.name, ()):
+            row[column] = _now()
+        row.update(values)
+        unique = UNIQUE.get(table.name)
+        if unique and self._conflict(table, unique, row):
+            raise PostgrestError(
+                f'duplicate key value violates unique constraint on "{table.name}"',
+                "23505",
+                409,
+            )
+        return table.insert(row)
+
+    def _conflict(self, table, columns, row):
+        candidates = table.lookup(columns[0], row.get(columns[0]))
+        for candidate in candidates:
+            if all(candidate.get(c) == row.get(c) for c in columns):
+                return candidate
+        return None
+
+    def _insert(self, table, params, prefer, body):
+        payload = body if isinstance(body, list) else [body]
+        modifiers = dict(params)
+        upsert = "resolution=merge-duplicates" in prefer
+        ignore = "resolution=ignore-duplicates" in prefer
+        conflict_columns = tuple(
+            c.strip()
+            for c in modifiers.get("on_conflict", "id").split(",")
+            if c.strip()
+        )
+        rows = []
+        for values in payload:
+            existing = (
+                self._conflict(table, conflict_columns, values)
+                if (upsert or ignore)
+                else None
+            )
+            if existing is not None:
+                if upsert:
+                    rows.append(table.update(existing, values))
+                    self._search_words.pop((table.name, existing["id"]), None)
+                continue
+            rows.append(self.insert_row(table, values))
+        if "select" in modifiers:
+            columns, embeds = parse_select(modifiers["select"])
+            rows = [self._project(table, r, columns, embeds, {}) for r in rows]
+        return 201, [dict(r) for r in rows], {}
+
+    def _update(self, table, params, body):
+        rows, _ = self.query(table, params + [("select", "id")])
+        updated = []
+        for ref in rows:
+            row = table.rows[ref["id"]]
+            updated.append(dict(table.update(row, body)))
+            self._search_words.pop((table.name, row["id"]), None)
+        return 200, updated, {}
+
+    def delete_row(self, table, row):
+        for child, column, action in ON_DELETE.get(table.name, ()):
+            child_table = self.tables[child]
+            for dependent in child_table.lookup(column, row["id"]):
+                if action == "cascade":
+                    self.delete_row(child_table, dependent)
+                else:
+                    child_table.update(dependent, {column: None})
+        table.delete(row)
+
+    def _delete(self, table, params):
+        rows, _ = self.query(table, params + [("select", "id")])
+        deleted = []
+        for ref in rows:
+            row = table.rows.get(ref["id"])
+            if row is not None:
+                deleted.append(dict(row))
+                self.delete_row(table, row)
+        return 200, deleted, {}
+
+    # -- RPC -----------------------------------------------------------------
+
+    def _rpc(self, name, params, args):
+        function = getattr(self, f"rpc_{name}", None)
+        if function is None:
+            raise PostgrestError(f"function {name} does not exist", "PGRST202", 404)
+        result = function(**args)
+        if isinstance(result, tuple):
+            # SETOF <table>: select/order/limit apply like on a table
+            table, rows = result
+            filters, modifiers, embedded = self._split_params(params)
+            columns, embeds = parse_select(modifiers.get("select", "*"))
+            if "order" in modifiers:
+                rows = order_rows(rows, parse_order(modifiers["order"]))
+            if "limit" in modifiers:
+                rows = rows[: int(modifiers["limit"])]
+            return (
+                200,
+                [self._project(table, r, columns, embeds, embedded) for r in rows],
+                {},
+            )
+        return 200, result, {}
+
+    def _words(self, product):
+        key = ("products", product["id"])
+        words = self._search_words.get(key)
+        if words is None:
+            name = normalize(product.get("name")).split()
+            text = name + normalize(product.get("description")).split()
+            words = self._search_words[key] = (name, text)
+        return words
+
+    def _search(self, query, category_id, min_price, max_price, is_offer):
+        terms = normalize(query or "").split()
+        if not terms:
+            return []
+        matches = []
+        for product in self.tables["products"].rows.values():
+            if category_id is not None and product.get("category_id") != int(
+                category_id
+            ):
+                continue
+            if min_price is not None and product["price"] < float(min_price):
+                continue
+            if max_price is not None and product["price"] > float(max_price):
+                continue
+            if is_offer is not None and product.get("is_offer") != _as_bool(is_offer):
+                continue
+            name, text = self._words(product)
+            if all(any(w.startswith(t) for w in text) for t in terms):
+                rank = sum(any(w.startswith(t) for w in name) for t in terms)
+                matches.append((rank, product))
+        return matches
+
+    def rpc_search_products(
+        self,
+        p_query,
+        p_category_id=None,
+        p_min_price=None,
+        p_max_price=None,
+        p_is_offer=None,
+        p_limit=48,
+        p_sort=None,
+    ):
+        matches = self._search(
+            p_query, p_category_id, p_min_price, p_max_price, p_is_offer
+        )
+        sorts = {
+            "price_asc": [("price", False), ("id", False)],
+            "price_desc": [("price", True), ("id", True)],
+            "name": [("name", False), ("id", False)],
+            "offers": [("is_offer", True), ("created_at", True), ("id", True)],
+            "newest": [("created_at", True), ("id", True)],
+        }
+        if p_sort in sorts:
+            rows = order_rows([p for _, p in matches], sorts[p_sort], p_limit)
+        else:
+            ranked = sorted(matches, key=lambda m: (-m[0], m[1]["id"]))
+            rows = [p for _, p in ranked[:p_limit]]
+        return self.tables["products"], rows
+
+    def rpc_product_facets(
+        self,
+        p_query=None,
+        p_category_id=None,
+        p_min_price=None,
+        p_max_price=None,
+        p_is_offer=None,
+        p_bands=(),
+    ):
+        if p_query:
+            matched = [
+                p for _, p in self._search(p_query, None, None, None, p_is_offer)
+            ]
+        else:
+            matched = [
+                p
+                for p in self.tables["products"].rows.values()
+                if p_is_offer is None or p.get("is_offer") == _as_bool(p_is_offer)
+            ]
+        bands = [float(b) for b in p_bands]
+        categories, band_counts = Counter(), Counter()
+        for p in matched:
+            in_price = (p_min_price is None or p["price"] >= float(p_min_price)) and (
+                p_max_price is None or p["price"] <= float(p_max_price)
+            )
+            in_category = p_category_id is None or p.get("category_id") == int(
+                p_category_id
+            )
+            if in_price:
+                categories[str(p.get("category_id") or "")] += 1
+            if in_category:
+                band_counts[str(bisect.bisect_right(bands, p["price"]))] += 1
+        return {"categories": dict(categories), "bands": dict(band_counts)}
+
+    def rpc_bulk_adjust_products(
+        self,
+        p_query=None,
+        p_category_id=None,
+        p_min_price=None,
+        p_max_price=None,
+        p_is_offer=None,
+        p_price_mode=None,
+        p_price_value=None,
+        p_stock_mode=None,
+        p_stock_value=None,
+        p_set_offer=None,
+        p_dry_run=True,
+    ):
+        products = self.tables["products"]
+        if p_query:
+            # Prefix matches only, like the real function (no trigram fallback)
+            targets = [
+                p
+                for _, p in self._search(
+                    p_query, p_category_id, p_min_price, p_max_price, p_is_offer
+                )
+            ]
+        else:
+            targets = [
+                p
+                for p in products.rows.values()
+                if (p_category_id is None or p.get("category_id") == int(p_category_id))
+                and (p_min_price is None or p["price"] >= float(p_min_price))
+                and (p_max_price is None or p["price"] <= float(p_max_price))
+                and (p_is_offer is None or p.get("is_offer") == _as_bool(p_is_offer))
+            ]
+        sample = sorted(p["name"] for p in targets)[:10]
+        if p_dry_run:
+            return {"count": len(targets), "sample": sample}
+        for p in targets:
+            price, stock = p["price"], p.get("stock") or 0
+            if p_price_mode == "percent":
+                price = round(price * (1 + float(p_price_value) / 100), 2)
+            elif p_price_mode == "amount":
+                price = round(price + float(p_price_value), 2)
+            elif p_price_mode == "set":
+                price = float(p_price_value)
+            if p_stock_mode == "add":
+                stock += int(p_stock_value)
+            elif p_stock_mode == "set":
+                stock = int(p_stock_value)
+            changes = {"price": max(0.0, price), "stock": max(0, stock)}
+            if p_set_offer is not None:
+                changes["is_offer"] = _as_bool(p_set_offer)
+            products.update(p, changes)
+        return {"count": len(targets), "sample": sample}
+
+    def rpc_order_stats(self):
+        stats = defaultdict(lambda: [0, 0.0])
+        for order in self.tables["orders"].rows.values():
+            entry = stats[order.get("status") or "pending"]
+            entry[0] += 1
+            entry[1] += order["total_amount"]
+        return [
+            {"status": status, "orders": n, "revenue": round(revenue, 2)}
+            for status, (n, revenue) in sorted(stats.items(), key=lambda s: -s[1][0])
+        ]
+
+    def rpc_add_cart_item(self, p_cart_id, p_product_id, p_quantity):
+        items = self.tables["cart_items"]
+        existing = self._conflict(
+            items,
+            ("cart_id", "product_id"),
+            {"cart_id": p_cart_id, "product_id": p_product_id},
+        )
+        if existing is not None:
+            return dict(
+                items.update(existing, {"quantity": existing["quantity"] + p_quantity})
+            )
+        return dict(
+            self.insert_row(
+                items,
+                {
+                    "cart_id": p_cart_id,
+                    "product_id": p_product_id,
+                    "quantity": p_quantity,
+                },
+            )
+        )
+
+    def rpc_add_user_cart_item(self, p_user_id, p_product_id, p_quantity):
+        return self.rpc_add_cart_item(
+            self._user_cart(p_user_id)["id"], p_product_id, p_quantity
+        )
+
+    def _user_cart(self, user_id):
+        carts = self.tables["carts"]
+        existing = carts.lookup("user_id", user_id)
+        if existing:
+            return carts.update(existing[0], {"updated_at": _now()})
+        return self.insert_row(carts, {"user_id": user_id})
+
+    def rpc_checkout_cart(
+        self, p_user_id, p_shipping, p_payment_method, p_transaction_ref=None
+    ):
+        carts = self.tables["carts"].lookup("user_id", p_user_id)
+        items = (
+            self.tables["cart_items"].lookup("cart_id", carts[0]["id"]) if carts else []
+        )
+        products = self.tables["products"]
+        lines = [(item, products.rows[item["product_id"]]) for item in items]
+        if not lines:
+            raise PostgrestError("empty_cart")
+        missing = [p["name"] for item, p in lines if p["stock"] < item["quantity"]]
+        if missing:
+            raise PostgrestError(f"insufficient_stock: {', '.join(missing)}")
+
+        total = round(sum(p["price"] * item["quantity"] for item, p in lines), 2)
+        order = self.insert_row(
+            self.tables["orders"],
+            {"user_id": p_user_id, "total_amount": total, "status": "pending"},
+        )
+        order_items = [
+            dict(
+                self.insert_row(
+                    self.tables["order_items"],
+                    {
+                        "order_id": order["id"],
+                        "product_id": p["id"],
+                        "product_name": p["name"],
+                        "quantity": item["quantity"],
+                        "price_at_purchase": p["price"],
+                    },
+                )
+            )
+            for item, p in lines
+        ]
+        for item, p in lines:
+            products.update(p, {"stock": p["stock"] - item["quantity"]})
+        shipping = self.insert_row(
+            self.tables["order_shipping"],
+            {
+                "order_id": order["id"],
+                **{
+                    k: p_shipping.get(k)
+                    for k in ("full_name", "address", "city", "phone", "notes")
+                },
+            },
+        )
+        payment = self.insert_row(
+            self.tables["payments"],
+            {
+                "order_id": order["id"],
+                "amount": total,
+                "method": p_payment_method,
+                "status": "paid",
+                "transaction_ref": p_transaction_ref,
+            },
+        )
+        for item, _ in lines:
+            self.tables["cart_items"].delete(item)
+        return {
+            **order,
+            "items": order_items,
+            "shipping": dict(shipping),
+            "payment": dict(payment),
+        }
+
+    # -- seeding -------------------------------------------------------------
+
+    def seed(self, products=10000, categories=12, users=()):
+        """Deterministic catalog of ``products`` rows across ``categories``.
+
+        ``users`` is a sequence of ``(email, password_hash, is_admin)``.
+        """
+        rng = random.Random(products)
+        words = (
+            "Taladro Martillo Pintura Tornillo Lámpara Cable Llave Sierra Cinta "
+            "Brocha Rodillo Tubo Grifo Cerradura Bisagra Escalera Manguera Foco "
+            "Enchufe Interruptor Clavo Pegamento Lija Nivel Alicate"
+        ).split()
+        qualifiers = (
+            "Profesional Eléctrico Inalámbrico Acrílica Industrial Compacto "
+            "Reforzado Premium Básico Galvanizado LED Ajustable"
+        ).split()
+        for i in range(1, categories + 1):
+            self.insert_row(
+                self.tables["categories"],
+                {"id": i, "name": f"Categoría {i}", "slug": f"categoria-{i}"},
+            )
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        table = self.tables["products"]
+        for i in range(1, products + 1):
+            name = f"{rng.choice(words)} {rng.choice(qualifiers)} {i}"
+            table.insert(
+                {
+                    "id": i,
+                    "name": name,
+                    "description": f"{name}. " + " ".join(rng.choices(words, k=40)),
+                    "price": round(rng.uniform(50, 15000), 2),
+                    "image_url": None,
+                    "category_id": rng.randint(1, categories),
+                    "is_offer": rng.random() < 0.1,
+                    "stock": rng.randint(0, 500),
+                    "created_at": (start + timedelta(minutes=i)).isoformat(),
+                }
+            )
+        for email, password_hash, is_admin in users:
+            self.insert_row(
+                self.tables["users"],
+                {"email": email, "password_hash": password_hash, "is_admin": is_admin},
+            )
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "t", "yes")
+    return bool(value)
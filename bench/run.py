@@ -0,0 +1,339 @@
+"""Offline load test: ``create_app()`` served against ``FakePostgREST``.
+
+    python -m bench.run --products 10000 --latency-ms 20 --requests 200
+
+Every scenario runs ``--requests`` iterations across ``--concurrency``
+threads (one logged-in session per thread where needed) and reports
+throughput, p50/p95/p99 latency and upstream PostgREST calls per route.
+``--json`` saves the report; ``--compare`` fails when p95 or upstream calls
+regress against a saved report by more than ``--tolerance``.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Config and the Supabase client read these at import time
+os.environ.setdefault("SUPABASE_URL", "http://fake-postgrest.local")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from bench.fake_postgrest import FakePostgREST, current_route  # noqa: E402
+
+PASSWORD = "bench-password"
+ADMIN_EMAIL = "admin@bench.local"
+SEARCH_TERMS = ("taladro", "pintura acrilica", "lampara led", "cable", "sierra pro")
+SORTS = ("", "newest", "price_asc", "price_desc", "name", "offers")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def request(self, client, route, method, url, **kwargs):
+        token = current_route.set(route)
+        started = time.perf_counter()
+        try:
+            response = client.open(url, method=method, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_route.reset(token)
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[route] += 1
+        return response
+
+
+# --- Scenarios -------------------------------------------------------------
+# Each takes (session, rng) and issues the requests of one user action.
+
+
+def browse_home(session, rng):
+    session.get("GET /", "/")
+
+
+def filter_offers(session, rng):
+    category = rng.randint(1, session.ctx["categories"])
+    sort = rng.choice(SORTS)
+    session.get("GET /offers", f"/offers?category={category}&sort={sort}")
+
+
+def search(session, rng):
+    term = rng.choice(SEARCH_TERMS)
+    session.get("GET /search", f"/search?search={term}&sort={rng.choice(SORTS)}")
+
+
+def product_detail(session, rng):
+    session.get("GET /product/<id>", f"/product/{session.random_product(rng)}")
+
+
+def add_to_cart(session, rng):
+    session.login()
+    session.post(
+        "POST /cart/add/<id>",
+        f"/cart/add/{session.random_product(rng)}",
+        data={"quantity": "1"},
+        headers={"X-Requested-With": "XMLHttpRequest"},
+    )
+
+
+def checkout(session, rng):
+    add_to_cart(session, rng)
+    session.post(
+        "POST /cart/checkout",
+        "/cart/checkout",
+        data={
+            "full_name": "Cliente Bench",
+            "address": "Calle 1",
+            "city": "Santo Domingo",
+            "phone": "809-000-0000",
+            "payment_method": "card",
+        },
+    )
+
+
+def admin_dashboard(session, rng):
+    session.login(admin=True)
+    session.get("GET /admin/", "/admin/")
+
+
+SCENARIOS = {
+    "browse_home": browse_home,
+    "filter_offers": filter_offers,
+    "search": search,
+    "product_detail": product_detail,
+    "add_to_cart": add_to_cart,
+    "checkout": checkout,
+    "admin_dashboard": admin_dashboard,
+}
+
+
+class Session:
+    """One simulated visitor: a test client with its own cookie jar."""
+
+    def __init__(self, app, recorder, ctx, index):
+        self.client = app.test_client()
+        self.recorder = recorder
+        self.ctx = ctx
+        self.index = index
+        self.logged_in = None
+
+    def get(self, route, url, **kwargs):
+        return self.recorder.request(self.client, route, "GET", url, **kwargs)
+
+    def post(self, route, url, **kwargs):
+        return self.recorder.request(self.client, route, "POST", url, **kwargs)
+
+    def login(self, admin=False):
+        email = ADMIN_EMAIL if admin else f"shopper{self.index}@bench.local"
+        if self.logged_in != email:
+            self.post(
+                "POST /auth/login",
+                "/auth/login",
+                data={"email": email, "password": PASSWORD},
+            )
+            self.logged_in = email
+
+    def random_product(self, rng):
+        return rng.randint(1, self.ctx["products"])
+
+
+# --- Runner ----------------------------------------------------------------
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(q / 100 * len(values))) - 1))
+    return values[rank]
+
+
+def run_scenario(app, fake, name, args, ctx):
+    scenario = SCENARIOS[name]
+    sessions = [Session(app, Recorder(), ctx, i) for i in range(args.concurrency)]
+    for i, session in enumerate(sessions):
+        rng = random.Random(args.seed + i)
+        for _ in range(args.warmup):
+            scenario(session, rng)
+
+    recorder = Recorder()
+    for session in sessions:
+        session.recorder = recorder
+    fake.reset_counters()
+
+    per_thread = [args.requests // args.concurrency] * args.concurrency
+    for i in range(args.requests % args.concurrency):
+        per_thread[i] += 1
+
+    def worker(session, iterations, seed):
+        rng = random.Random(seed)
+        for _ in range(iterations):
+            scenario(session, rng)
+
+    threads = [
+        threading.Thread(target=worker, args=(s, n, args.seed * 1000 + i))
+        for i, (s, n) in enumerate(zip(sessions, per_thread))
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for route, latencies in recorder.latencies.items():
+        latencies.sort()
+        n = len(latencies)
+        calls = fake.calls.get(route, Counter())
+        routes[route] = {
+            "requests": n,
+            "errors": recorder.errors[route],
+            "throughput": n / elapsed if elapsed else 0.0,
+            "mean_ms": 1000 * sum(latencies) / n,
+            "p50_ms": 1000 * percentile(latencies, 50),
+            "p95_ms": 1000 * percentile(latencies, 95),
+            "p99_ms": 1000 * percentile(latencies, 99),
+            "upstream_calls": sum(calls.values()) / n,
+            "upstream_ms": 1000 * fake.server_time.get(route, 0.0) / n,
+            "upstream_breakdown": {
+                call: count / n for call, count in calls.most_common()
+            },
+        }
+    return {"elapsed_s": elapsed, "routes": routes}
+
+
+def build_app(args, fake):
+    import extensions
+    from app import create_app
+    from config import Config
+
+    # Keep the pooled transport (retries, counters) but answer from the fake
+    extensions.http_transport._transport = fake
+
+    class BenchConfig(Config):
+        CATALOG_SNAPSHOT = args.snapshot
+        CACHE_BACKEND = "redis" if args.cache_backend == "fakeredis" else "memory"
+        CACHE_REDIS_URL = "fakeredis://bench"
+
+    if args.no_cache:
+        BenchConfig.CATALOG_CACHE_TTL = 0
+        BenchConfig.CART_CACHE_TTL = 0
+        BenchConfig.PAGE_CACHE_TTL = 0
+
+    return create_app(BenchConfig)
+
+
+def print_report(report):
+    header = (
+        f"{'route':<24}{'req':>6}{'err':>5}{'req/s':>9}{'p50':>9}{'p95':>9}"
+        f"{'p99':>9}{'calls':>7}{'up ms':>8}"
+    )
+    for name, result in report["scenarios"].items():
+        print(f"\n== {name} ({result['elapsed_s']:.2f}s)")
+        print(header)
+        for route, r in sorted(result["routes"].items()):
+            print(
+                f"{route:<24}{r['requests']:>6}{r['errors']:>5}"
+                f"{r['throughput']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+                f"{r['p99_ms']:>9.1f}{r['upstream_calls']:>7.2f}"
+                f"{r['upstream_ms']:>8.2f}"
+            )
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of p95 latency or upstream calls per request."""
+    regressions = []
+    for name, result in report["scenarios"].items():
+        base_routes = baseline.get("scenarios", {}).get(name, {}).get("routes", {})
+        for route, r in result["routes"].items():
+            base = base_routes.get(route)
+            if base is None:
+                continue
+            for metric in ("p95_ms", "upstream_calls"):
+                if r[metric] > base[metric] * (1 + tolerance) + 1e-9:
+                    regressions.append(
+                        f"{name} {route} {metric}: "
+                        f"{base[metric]:.2f} -> {r[metric]:.2f}"
+                    )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help="comma-separated subset of: " + ", ".join(SCENARIOS),
+    )
+    parser.add_argument("--snapshot", action="store_true", help="CATALOG_SNAPSHOT on")
+    parser.add_argument(
+        "--cache-backend", choices=("memory", "fakeredis"), default="memory"
+    )
+    parser.add_argument("--no-cache", action="store_true", help="disable TTL caches")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="baseline report to check against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    fake = FakePostgREST(
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, seed=args.seed
+    )
+    password_hash = generate_password_hash(PASSWORD)
+    users = [(ADMIN_EMAIL, password_hash, True)] + [
+        (f"shopper{i}@bench.local", password_hash, False)
+        for i in range(args.concurrency)
+    ]
+    fake.seed(products=args.products, categories=args.categories, users=users)
+    app = build_app(args, fake)
+
+    ctx = {"products": args.products, "categories": args.categories}
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+        "scenarios": {},
+    }
+    for name in names:
+        report["scenarios"][name] = run_scenario(app, fake, name, args, ctx)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
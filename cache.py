@@ -0,0 +1,471 @@
+import hashlib
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import g, has_app_context, make_response, request, session
+from flask_login import current_user
+from markupsafe import Markup
+
+try:
+    import redis
+except ImportError:  # optional: only needed for CACHE_BACKEND = "redis"
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Caught around every Redis call: an unreachable server means cache misses
+# and skipped writes, never a failed request
+REDIS_ERRORS = (redis.RedisError,) if redis is not None else ()
+
+_MISSING = object()
+
+
+# Request-scoped identity map
+# Each entity is fetched at most once per request; writes forget the entry so
+# the next read in the same request goes back to Supabase.
+def _request_store(namespace):
+    if not has_app_context():
+        return None
+    identity_map = g.setdefault("_identity_map", {})
+    return identity_map.setdefault(namespace, {})
+
+
+def request_cached(namespace, key, loader):
+    store = _request_store(namespace)
+    if store is None:
+        return loader()
+    key = str(key)
+    if key in store:
+        return store[key]
+    value = loader()
+    if value is not None:
+        store[key] = value
+    return value
+
+
+def request_forget(namespace, key=None):
+    store = _request_store(namespace)
+    if store is None:
+        return
+    if key is None:
+        store.clear()
+    else:
+        store.pop(str(key), None)
+
+
+class MemoryBackend:
+    """Per-process LRU store with a deadline per entry."""
+
+    shared = False
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._generations = {}
+        self._cleared = 0
+        self._lock = threading.Lock()
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._cleared, self._generations.get(namespace, 0)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                return _MISSING
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, generation=None):
+        with self._lock:
+            if generation is not None and generation != (
+                self._cleared,
+                self._generations.get(key[0], 0),
+            ):
+                return
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._bump(key[0])
+
+    def invalidate(self, namespace):
+        with self._lock:
+            for key in [k for k in self._data if k[0] == namespace]:
+                del self._data[key]
+            self._bump(namespace)
+
+    def _bump(self, namespace):
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._cleared += 1
+
+    def size(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """Store shared by every worker through a Redis-protocol server.
+
+    Values are pickled under ``<prefix>:<namespace>:<hash of key>`` and each
+    namespace keeps a set of its keys, so ``invalidate`` deletes exactly that
+    namespace and every worker sees it on its next read.
+    """
+
+    shared = True
+
+    def __init__(self, client, prefix):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return f"{self.prefix}:{key[0]}:{digest}"
+
+    def _members(self, namespace):
+        return f"{self.prefix}:{namespace}:__keys__"
+
+    def _generation(self, namespace):
+        return f"{self.prefix}:{namespace}:__generation__"
+
+    def generation(self, namespace):
+        try:
+            return int(self.client.get(self._generation(namespace)) or 0)
+        except REDIS_ERRORS as e:
+            logger.warning("Redis generation read failed: %s", e)
+            return None
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self._key(key))
+        except REDIS_ERRORS as e:
+            logger.warning("Redis get failed, treating as a miss: %s", e)
+            return _MISSING
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl, generation=None):
+        name = self._key(key)
+        try:
+            with self.client.pipeline() as pipe:
+                if generation is not None:
+                    # An invalidation between the check and EXEC aborts it
+                    pipe.watch(self._generation(key[0]))
+                    if int(pipe.get(self._generation(key[0])) or 0) != generation:
+                        return
+                    pipe.multi()
+                pipe.set(name, pickle.dumps(value), ex=max(1, int(ttl)))
+                pipe.sadd(self._members(key[0]), name)
+                pipe.sadd(f"{self.prefix}:__namespaces__", key[0])
+                pipe.execute()
+        except redis.WatchError:
+            pass
+        except REDIS_ERRORS as e:
+            logger.warning("Redis set failed, value not cached: %s", e)
+
+    def delete(self, key):
+        name = self._key(key)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(name)
+        pipe.srem(self._members(key[0]), name)
+        pipe.incr(self._generation(key[0]))
+        try:
+            pipe.execute()
+        except REDIS_ERRORS as e:
+            logger.warning("Redis delete failed: %s", e)
+
+    def invalidate(self, namespace):
+        # Read and drop the key set in one MULTI, so a key added meanwhile
+        # lands in a fresh set instead of being orphaned
+        members = self._members(namespace)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.smembers(members)
+        pipe.delete(members)
+        pipe.incr(self._generation(namespace))
+        try:
+            names, _, _ = pipe.execute()
+            if names:
+                self.client.delete(*names)
+        except REDIS_ERRORS as e:
+            logger.warning("Redis invalidate of %s failed: %s", namespace, e)
+
+    def clear(self):
+        try:
+            namespaces = self.client.smembers(f"{self.prefix}:__namespaces__")
+        except REDIS_ERRORS as e:
+            logger.warning("Redis clear failed: %s", e)
+            return
+        for namespace in namespaces:
+            self.invalidate(namespace.decode())
+
+    def size(self):
+        try:
+            namespaces = self.client.smembers(f"{self.prefix}:__namespaces__")
+            pipe = self.client.pipeline(transaction=False)
+            for namespace in namespaces:
+                pipe.scard(self._members(namespace.decode()))
+            # The key sets can briefly list entries Redis already expired
+            return sum(pipe.execute())
+        except REDIS_ERRORS:
+            return 0
+
+
+_redis_clients = {}
+
+
+def redis_client(url):
+    """One client (and connection pool) per URL; ``fakeredis://`` for tests."""
+    if url not in _redis_clients:
+        if url.startswith("fakeredis://"):
+            import fakeredis
+
+            _redis_clients[url] = fakeredis.FakeRedis()
+        else:
+            _redis_clients[url] = redis.Redis.from_url(url)
+    return _redis_clients[url]
+
+
+def shared_client(app):
+    """The Redis client when ``CACHE_BACKEND`` is "redis", else None."""
+    if app.config.get("CACHE_BACKEND", "memory") != "redis":
+        return None
+    url = app.config["CACHE_REDIS_URL"]
+    if redis is None and not url.startswith("fakeredis://"):
+        logger.warning("CACHE_BACKEND=redis requires the redis package; using memory")
+        return None
+    return redis_client(url)
+
+
+class TTLCache:
+    """Cache whose entries expire after ``ttl`` seconds.
+
+    Entries live in a per-process LRU (``MemoryBackend``) unless the app sets
+    ``CACHE_BACKEND = "redis"``, in which case all workers share one
+    ``RedisBackend`` and invalidations reach every worker.
+    """
+
+    def __init__(self, ttl=60, maxsize=256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.backend = MemoryBackend(maxsize)
+
+    def init_app(self, app, prefix):
+        self.ttl = app.config.get(f"{prefix}_TTL", self.ttl)
+        self.maxsize = app.config.get(f"{prefix}_SIZE", self.maxsize)
+        client = shared_client(app)
+        if client is not None:
+            namespace = app.config.get("CACHE_KEY_PREFIX", "ferremix")
+            self.backend = RedisBackend(client, f"{namespace}:{prefix.lower()}")
+        else:
+            # Shared entries outlive a worker restart; local ones start empty
+            self.backend = MemoryBackend(self.maxsize)
+
+    def get(self, key, loader):
+        value = self.peek(key)
+        if value is _MISSING:
+            generation = self.generation(key)
+            value = loader()
+            self.set(key, value, generation)
+        return value
+
+    def generation(self, key):
+        """Token for ``set``: read it before loading the value for ``key``."""
+        return self.backend.generation(key[0])
+
+    def peek(self, key):
+        """The live value for ``key``, or ``_MISSING`` (counted as a miss)."""
+        value = self.backend.get(key)
+        if value is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, generation=None):
+        """Store ``value`` unless its namespace changed since ``generation``.
+
+        A write's ``invalidate``/``delete`` landing while the value was being
+        loaded would otherwise be undone by storing pre-write data.
+        """
+        if self.ttl > 0:
+            self.backend.set(key, value, self.ttl, generation)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def invalidate(self, namespace):
+        # Keys are tuples whose first element names the data set they belong to
+        self.backend.invalidate(namespace)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {
+            "backend": "redis" if self.backend.shared else "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": self.backend.size(),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+
+class VersionCounter:
+    """Generation number of a data set.
+
+    Cache keys embed the current value, so a bump orphans every entry built
+    from older data without scanning the cache. With the shared backend the
+    counter lives in Redis, so a bump in one worker is seen by all of them;
+    it is read at most once per request.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+        self._changed_at = _now()
+        self._client = None
+        self._key = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._client = shared_client(app)
+        prefix = app.config.get("CACHE_KEY_PREFIX", "ferremix")
+        self._key = f"{prefix}:version:{self.name}"
+
+    @property
+    def value(self):
+        return self._current()[0]
+
+    @property
+    def changed_at(self):
+        return self._current()[1]
+
+    def _current(self):
+        if self._client is None:
+            return self._value, self._changed_at
+        return request_cached("versions", self.name, self._fetch)
+
+    def _fetch(self):
+        try:
+            value, changed_at = self._client.hmget(self._key, "value", "changed_at")
+        except REDIS_ERRORS as e:
+            # This worker's own counter keeps its local structures coherent
+            logger.warning("Redis read of version %s failed: %s", self.name, e)
+            return self._value, self._changed_at
+        if value is None:
+            return 0, self._changed_at
+        return int(value), datetime.fromtimestamp(int(changed_at), timezone.utc)
+
+    def bump(self):
+        changed_at = _now()
+        if self._client is not None:
+            pipe = self._client.pipeline()
+            pipe.hincrby(self._key, "value", 1)
+            pipe.hset(self._key, "changed_at", int(changed_at.timestamp()))
+            request_forget("versions", self.name)
+            try:
+                pipe.execute()
+                return
+            except REDIS_ERRORS as e:
+                # Falls back to this worker's counter, which _fetch also uses
+                logger.warning("Redis bump of version %s failed: %s", self.name, e)
+        with self._lock:
+            self._value += 1
+            self._changed_at = changed_at
+
+
+def _now():
+    # HTTP dates have one-second resolution
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+# Categories and product listings change only through the admin panel
+catalog_cache = TTLCache()
+
+# Bumped on product and category writes; checkout only drops the detail
+# pages of the purchased products (forget_pages)
+catalog_version = VersionCounter("catalog")
+
+# Bumped on product and category writes only; in-process catalog structures
+# (snapshot, typeahead index) rebuild when another worker moves it
+listing_version = VersionCounter("listing")
+
+# Rendered catalog pages for anonymous visitors and HTML fragments for everyone
+page_cache = TTLCache(ttl=60, maxsize=512)
+
+# Per-user cart badge count and mini-cart summary, dropped on cart mutations
+cart_cache = TTLCache(ttl=30, maxsize=10000)
+
+
+def _page_cacheable():
+    # Logged-in pages carry the cart badge and account menu; pending flash
+    # messages are per session too
+    return (
+        request.method == "GET"
+        and not current_user.is_authenticated
+        and "_flashes" not in session
+    )
+
+
+def cached_page(view):
+    """Serve anonymous GETs of ``view`` from ``page_cache``.
+
+    Entries are keyed by the catalog version and the full URL; only 200
+    responses are stored, and hits skip both Jinja and Supabase.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _page_cacheable():
+            return view(*args, **kwargs)
+        key = ("pages", catalog_version.value, request.full_path)
+        cached = page_cache.peek(key)
+        if cached is not _MISSING:
+            body, mimetype = cached
+            response = make_response(body)
+            response.mimetype = mimetype
+            response.headers["X-Page-Cache"] = "hit"
+            return response
+
+        generation = page_cache.generation(key)
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            page_cache.set(key, (response.get_data(), response.mimetype), generation)
+            response.headers["X-Page-Cache"] = "miss"
+        return response
+
+    return wrapper
+
+
+def forget_pages(paths):
+    """Drop the cached anonymous pages of ``paths`` (as requested, no query)."""
+    version = catalog_version.value
+    for path in paths:
+        # Keys use request.full_path, which always ends in "?" plus the query
+        page_cache.delete(("pages", version, f"{path}?"))
+
+
+def cached_fragment(name, *key, caller):
+    """Jinja ``{% call cached_fragment(name) %}`` block cached per catalog version.
+
+    The block must not depend on the current user: its key is only the
+    catalog version, the request URL and ``key``.
+    """
+    cache_key = ("fragments", catalog_version.value, name, request.full_path) + key
+    return Markup(page_cache.get(cache_key, lambda: str(caller())))
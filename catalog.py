@@ -0,0 +1,254 @@
+import logging
+import threading
+import time
+
+from cache import listing_version
+
+try:
+    import numpy as np
+except ImportError:  # optional: the snapshot stays disabled without NumPy
+    np = None
+
+logger = logging.getLogger(__name__)
+
+NO_CATEGORY = -1
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "t", "yes")
+    return bool(value)
+
+
+class CatalogSnapshot:
+    """Column-oriented copy of the product catalog.
+
+    Price, stock, category and offer flags live in NumPy arrays so filters,
+    price ranges and facet counts are vectorized mask operations; the full
+    product dicts are kept alongside, indexed by row position.
+    """
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.position = {p["id"]: i for i, p in enumerate(self.rows)}
+        self.ids = np.array([p["id"] for p in self.rows], dtype=np.int64)
+        self.price = np.array([float(p["price"]) for p in self.rows], dtype=np.float64)
+        self.stock = np.array([p.get("stock") or 0 for p in self.rows], dtype=np.int64)
+        self.category_id = np.array(
+            [p.get("category_id") or NO_CATEGORY for p in self.rows], dtype=np.int64
+        )
+        self.is_offer = np.array(
+            [bool(p.get("is_offer")) for p in self.rows], dtype=bool
+        )
+        self.alive = np.ones(len(self.rows), dtype=bool)
+        self.columns = {
+            "id": self.ids,
+            "price": self.price,
+            "is_offer": self.is_offer,
+            "name": np.array([p.get("name") or "" for p in self.rows], dtype=str),
+            "created_at": np.array(
+                [p.get("created_at") or "" for p in self.rows], dtype=str
+            ),
+        }
+        self._orders = {}
+        self.category_names = {
+            p["category_id"]: p["category"]["name"]
+            for p in self.rows
+            if p.get("category_id") and p.get("category")
+        }
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def upsert(self, row):
+        """Patch an existing product in place; False if that is not possible.
+
+        New rows are not appended and renames are not patched: growing the
+        arrays (or the fixed-width name column) under concurrent readers is
+        unsafe, so the holder rebuilds instead.
+        """
+        i = self.position.get(row["id"])
+        if i is None or row.get("name", self.rows[i]["name"]) != self.rows[i]["name"]:
+            return False
+        # Keep the snapshot's own projection; writes return every column
+        row = {**self.rows[i], **{k: v for k, v in row.items() if k in self.rows[i]}}
+        name = self.category_names.get(row.get("category_id"))
+        row["category"] = {"name": name} if name else None
+        self.rows[i] = row
+        self.price[i] = float(row["price"])
+        self.stock[i] = row.get("stock") or 0
+        self.category_id[i] = row.get("category_id") or NO_CATEGORY
+        self.is_offer[i] = bool(row.get("is_offer"))
+        self.alive[i] = True
+        self._orders = {}
+        return True
+
+    def remove(self, id):
+        i = self.position.get(int(id))
+        if i is not None:
+            self.alive[i] = False
+
+    def _mask(self, filters, skip=()):
+        mask = self.alive.copy()
+        if "is_offer" in filters:
+            mask &= self.is_offer == _as_bool(filters["is_offer"])
+        if filters.get("category_id") and "category_id" not in skip:
+            mask &= self.category_id == int(filters["category_id"])
+        if filters.get("min_price") and "price" not in skip:
+            mask &= self.price >= float(filters["min_price"])
+        if filters.get("max_price") and "price" not in skip:
+            mask &= self.price <= float(filters["max_price"])
+        return mask
+
+    def _permutation(self, order):
+        """Row positions sorted by ``order``; computed once per sort mode.
+
+        Sort modes use one direction for all of their columns, so descending
+        orders are the ascending permutation reversed.
+        """
+        permutation = self._orders.get(order)
+        if permutation is None:
+            # lexsort treats its last key as the primary one
+            keys = [self.columns[column] for column, _ in reversed(order)]
+            permutation = np.lexsort(keys)
+            if order[0][1]:
+                permutation = permutation[::-1]
+            self._orders[order] = permutation
+        return permutation
+
+    def filter(self, filters, limit=None, order=None):
+        if order:
+            permutation = self._permutation(order)
+            positions = permutation[self._mask(filters)[permutation]]
+        else:
+            positions = np.flatnonzero(self._mask(filters))
+        if limit:
+            positions = positions[:limit]
+        return [self.rows[i] for i in positions]
+
+    def facets(self, filters, bands):
+        in_price = self._mask(filters, skip=("category_id",))
+        in_category = self._mask(filters, skip=("price",))
+
+        ids, counts = np.unique(self.category_id[in_price], return_counts=True)
+        categories = {
+            (None if cid == NO_CATEGORY else int(cid)): int(n)
+            for cid, n in zip(ids, counts)
+        }
+        # Same numbering as Postgres width_bucket: count of bounds <= price
+        band_index = np.searchsorted(
+            np.asarray(bands, dtype=np.float64),
+            self.price[in_category],
+            side="right",
+        )
+        band_counts = np.bincount(band_index, minlength=len(bands) + 1)
+        bounds = (None,) + tuple(bands) + (None,)
+        price_bands = [
+            {"min": bounds[i], "max": bounds[i + 1], "count": int(n)}
+            for i, n in enumerate(band_counts)
+            if n
+        ]
+        return {
+            "categories": categories,
+            "total": sum(categories.values()),
+            "price_bands": price_bands,
+        }
+
+
+class CatalogSnapshotHolder:
+    """Lazily (re)built snapshot, patched in place on product writes."""
+
+    def __init__(self, enabled=False, ttl=300):
+        self.enabled = enabled
+        self.ttl = ttl
+        self._snapshot = None
+        self._built_at = None
+        self._version = None
+        self._rebuilding = False
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get("CATALOG_SNAPSHOT", self.enabled)
+        self.ttl = app.config.get("CATALOG_SNAPSHOT_TTL", self.ttl)
+        if self.enabled and np is None:
+            logger.warning("CATALOG_SNAPSHOT requires NumPy; snapshot disabled")
+            self.enabled = False
+        self.invalidate()
+
+    def current(self, loader):
+        """The live snapshot, built from ``loader()`` rows; None when disabled.
+
+        A stale snapshot keeps being served while one thread rebuilds it
+        outside the lock; until the first build finishes other threads get
+        None and fall back to querying.
+        """
+        if not self.enabled:
+            return None
+        version = listing_version.value
+        with self._lock:
+            snapshot = self._snapshot
+            if self._rebuilding or (
+                snapshot is not None
+                and self._version == version
+                and time.monotonic() - self._built_at < self.ttl
+            ):
+                return snapshot
+            self._rebuilding = True
+        try:
+            snapshot = CatalogSnapshot(loader())
+        except BaseException:
+            with self._lock:
+                self._rebuilding = False
+            raise
+        with self._lock:
+            # Tagged with the version read before loading, so a write made
+            # meanwhile triggers another rebuild instead of being lost
+            self._snapshot = snapshot
+            self._built_at = time.monotonic()
+            self._version = version
+            self._rebuilding = False
+        return snapshot
+
+    def upsert(self, rows):
+        with self._lock:
+            if self._snapshot is not None:
+                for row in rows:
+                    if not self._snapshot.upsert(row):
+                        self._snapshot = None
+                        return
+                self._patched()
+
+    def remove(self, id):
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.remove(id)
+                self._patched()
+
+    def _patched(self):
+        # Our own write already bumped listing_version; adopt it so this
+        # worker keeps the patched snapshot instead of rebuilding
+        self._version = listing_version.value
+
+    def adjust_stock(self, items):
+        """Apply checkout stock decrements from order items in place."""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            for item in items or []:
+                i = snapshot.position.get(item.get("product_id"))
+                if i is not None:
+                    snapshot.stock[i] -= item["quantity"]
+                    snapshot.rows[i] = {
+                        **snapshot.rows[i],
+                        "stock": int(snapshot.stock[i]),
+                    }
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._built_at = None
+            self._version = None
+
+
+catalog_snapshot = CatalogSnapshotHolder()
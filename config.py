@@ -9,5 +9,70 @@ class Config:
     # Supabase API Configuration
     SUPABASE_URL = os.environ.get('SUPABASE_URL')
     SUPABASE_KEY = os.environ.get('SUPABASE_KEY') or os.environ.get('ANNON_KEY')
+
+    # HTTP transport shared by every Supabase call (see transport.py).
+    # POOL_SIZE should cover the gunicorn threads times the fan-out workers.
+    SUPABASE_POOL_SIZE = int(os.environ.get('SUPABASE_POOL_SIZE', 20))
+    SUPABASE_KEEPALIVE = int(os.environ.get('SUPABASE_KEEPALIVE', 20))
+    SUPABASE_KEEPALIVE_EXPIRY = float(os.environ.get('SUPABASE_KEEPALIVE_EXPIRY', 30))
+    SUPABASE_HTTP2 = os.environ.get('SUPABASE_HTTP2', '1') == '1'
+    SUPABASE_CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_CONNECT_TIMEOUT', 3))
+    SUPABASE_READ_TIMEOUT = float(os.environ.get('SUPABASE_READ_TIMEOUT', 10))
+    SUPABASE_RETRIES = int(os.environ.get('SUPABASE_RETRIES', 2))
+    SUPABASE_RETRY_BACKOFF = float(os.environ.get('SUPABASE_RETRY_BACKOFF', 0.1))
+    SUPABASE_FANOUT_WORKERS = int(os.environ.get('SUPABASE_FANOUT_WORKERS', 8))
     
+    # Cache backend: "memory" (per worker) or "redis" (shared by every worker,
+    # invalidations seen by all; needs the redis package, or "fakeredis://" URL)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'ferremix')
+
+    # Catalog cache (categories and product listings), TTL in seconds
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 60))
+    CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', 256))
+
+    # Rendered catalog pages (anonymous visitors) and HTML fragments, TTL in seconds
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 60))
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 512))
+
+    # Browser/CDN max-age for anonymous catalog pages; fingerprinted static files
+    CATALOG_MAX_AGE = int(os.environ.get('CATALOG_MAX_AGE', 60))
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 31536000))
+
+    # Columnar in-process product catalog (requires NumPy), rebuilt every TTL seconds
+    CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT', '0') == '1'
+    CATALOG_SNAPSHOT_TTL = int(os.environ.get('CATALOG_SNAPSHOT_TTL', 300))
+
+    # Seconds before the /search/suggest prefix index is fully rebuilt
+    SUGGEST_INDEX_TTL = int(os.environ.get('SUGGEST_INDEX_TTL', 300))
+
+    # Per-user cart badge and /cart/summary cache, TTL in seconds
+    CART_CACHE_TTL = int(os.environ.get('CART_CACHE_TTL', 30))
+    CART_CACHE_SIZE = int(os.environ.get('CART_CACHE_SIZE', 10000))
+
+    # Keyset pagination page sizes (capped at models.MAX_PAGE_SIZE)
+    ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', 50))
+    ORDERS_PAGE_SIZE = int(os.environ.get('ORDERS_PAGE_SIZE', 20))
+
+    # Bulk product import: rows per insert/upsert call and calls in flight
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+    IMPORT_CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', 4))
+
+    # Prometheus /metrics endpoint (per worker) and the Server-Timing header.
+    # /metrics is only served to admins and to scrapers sending
+    # "Authorization: Bearer <METRICS_TOKEN>"; Server-Timing, when enabled,
+    # is only added to admins' responses.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+
+    # Sampling profiler: admins add "X-Profile: 1" (or ?_profile=1) to a request;
+    # with PROFILE_SLOW_MS > 0 every request is sampled and those slower are kept.
+    # Files are "collapsed" stacks (flamegraph.pl) or "speedscope" JSON.
+    PROFILE_SLOW_MS = int(os.environ.get('PROFILE_SLOW_MS', 0))
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+    PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT', 'collapsed')
+
     # No SQLALCHEMY definitions needed anymore
@@ -1,5 +1,11 @@
 from flask_login import LoginManager
 from supabase import create_client, Client
+from supabase.lib.client_options import SyncClientOptions
+from config import Config
+from transport import build_http_client
+from profiler import request_profiler
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import os
 from dotenv import load_dotenv
 
@@ -14,6 +20,38 @@ login_manager.login_message_category = 'info'
 url: str = os.environ.get("SUPABASE_URL", "")
 key: str = os.environ.get("SUPABASE_KEY") or os.environ.get("ANNON_KEY", "")
 
-# Create client globally (this is thread-safe for reading mainly)
-# For writing, it handles requests via HTTP
-supabase: Client = create_client(url, key)
+# Create client globally. Every call goes through one pooled keep-alive
+# httpx client, which is safe to share across gunicorn worker threads.
+http_client, http_transport = build_http_client(Config)
+supabase: Client = create_client(
+    url, key, options=SyncClientOptions(httpx_client=http_client)
+)
+
+# Fan-out executor for independent Supabase calls made within one request
+executor = ThreadPoolExecutor(
+    max_workers=Config.SUPABASE_FANOUT_WORKERS,
+    thread_name_prefix="supabase-fanout",
+)
+_in_fanout = contextvars.ContextVar("in_fanout", default=False)
+
+
+def _run_fanout_call(call):
+    _in_fanout.set(True)
+    with request_profiler.following():
+        return call()
+
+
+def gather(*calls):
+    """Run independent zero-argument calls concurrently, results in call order.
+
+    Each call runs in a copy of the caller's context, so the Flask request,
+    ``g`` and ``current_user`` remain available in the worker threads. Nested
+    fan-outs run inline to avoid starving the pool.
+    """
+    if len(calls) < 2 or _in_fanout.get():
+        return [call() for call in calls]
+    futures = [
+        executor.submit(contextvars.copy_context().run, _run_fanout_call, call)
+        for call in calls
+    ]
+    return [future.result() for future in futures]
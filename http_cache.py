@@ -0,0 +1,92 @@
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request
+from flask_login import current_user
+
+from cache import catalog_version
+
+
+def http_cached(max_age=None, per_user=True):
+    """Validators and Cache-Control for a GET view.
+
+    Adds a strong ETag hashed from the body and answers ``If-None-Match``
+    with 304. Anonymous (or ``per_user=False``) responses are public for
+    ``max_age`` seconds (``CATALOG_MAX_AGE`` by default) and carry the catalog
+    Last-Modified; logged-in pages include the cart badge, so they are private
+    and always revalidated.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+            if per_user and current_user.is_authenticated:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            else:
+                response.cache_control.public = True
+                response.cache_control.max_age = (
+                    current_app.config["CATALOG_MAX_AGE"]
+                    if max_age is None
+                    else max_age
+                )
+                response.last_modified = catalog_version.changed_at
+            if per_user:
+                response.vary.add("Cookie")
+            response.add_etag()
+            return response.make_conditional(request)
+
+        return wrapper
+
+    return decorator
+
+
+class StaticFingerprints:
+    """Content-hash ``?v=`` on ``url_for('static')`` URLs.
+
+    Versioned URLs change whenever the file does, so they are served with a
+    long, immutable max-age; unversioned requests keep Flask's revalidation.
+    """
+
+    def __init__(self):
+        self._digests = {}
+
+    def init_app(self, app):
+        self._digests.clear()
+        app.url_defaults(self._add_version)
+        app.after_request(self._cache_headers)
+
+    def fingerprint(self, filename):
+        path = os.path.join(current_app.static_folder, filename)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        cached = self._digests.get(filename)
+        if cached is None or cached[0] != mtime:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:12]
+            cached = self._digests[filename] = (mtime, digest)
+        return cached[1]
+
+    def _add_version(self, endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            version = self.fingerprint(values["filename"])
+            if version:
+                values["v"] = version
+
+    def _cache_headers(self, response):
+        if request.endpoint == "static" and request.args.get("v"):
+            response.cache_control.no_cache = False
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config["STATIC_MAX_AGE"]
+            response.cache_control.immutable = True
+        return response
+
+
+static_fingerprints = StaticFingerprints()
@@ -0,0 +1,263 @@
+import re
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, abort, g, has_request_context, request
+from flask_login import current_user
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000)
+CALL_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+_REST_PATH = re.compile(r"/rest/v1/(rpc/)?([^/?]+)")
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, (counts, total, count) in sorted(self._series.items()):
+            for bound, n in zip(self.buckets, counts):
+                labels = _labels(self.labels + ("le",), values + (bound,))
+                yield f"{self.name}_bucket{labels} {n}"
+            labels = _labels(self.labels + ("le",), values + ("+Inf",))
+            yield f"{self.name}_bucket{labels} {count}"
+            labels = _labels(self.labels, values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series = defaultdict(float)
+
+    def inc(self, labels, value=1):
+        self._series[labels] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for values, total in sorted(self._series.items()):
+            yield f"{self.name}{_labels(self.labels, values)} {total}"
+
+
+def describe_call(upstream):
+    """(table, operation) of a PostgREST request; RPCs use the function name."""
+    method = upstream.method
+    match = _REST_PATH.search(upstream.url.path)
+    if match is None:
+        return "other", method.lower()
+    rpc, name = match.groups()
+    if rpc:
+        return name, "rpc"
+    if method == "POST":
+        prefer = upstream.headers.get("prefer", "")
+        return name, "upsert" if "duplicates" in prefer else "insert"
+    operation = {"GET": "select", "HEAD": "count", "PATCH": "update"}
+    return name, operation.get(method, method.lower())
+
+
+def row_count(response):
+    """Rows returned, from PostgREST's ``Content-Range: 0-24/*`` header."""
+    returned = response.headers.get("content-range", "").split("/")[0]
+    if returned == "*":
+        return 0
+    start, _, end = returned.partition("-")
+    if start.isdigit() and end.isdigit():
+        return int(end) - int(start) + 1
+    return None
+
+
+class Metrics:
+    """Supabase calls and request latency per Flask endpoint.
+
+    Every response read through the shared ``PooledTransport`` is recorded
+    with its table, operation, duration, row count and size, attributed to
+    the endpoint of the request that made it (fan-out threads included).
+    Series are per worker process; ``/metrics`` serves them in Prometheus
+    text format to admins or to scrapers holding ``METRICS_TOKEN``; with
+    ``SERVER_TIMING`` on, admins' responses get a ``Server-Timing`` header.
+    Both name internal tables and RPCs, so neither is public.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.server_timing = False
+        self.token = None
+        self._sources = []
+        self._lock = threading.Lock()
+        self.request_duration = Histogram(
+            "ferremix_http_request_duration_seconds",
+            "Time spent handling a request, up to the response headers.",
+            ("endpoint", "method", "status"),
+            DURATION_BUCKETS,
+        )
+        self.query_duration = Histogram(
+            "ferremix_supabase_query_duration_seconds",
+            "Supabase call duration, including reading the response body.",
+            ("endpoint", "table", "operation"),
+            DURATION_BUCKETS,
+        )
+        self.query_rows = Histogram(
+            "ferremix_supabase_query_rows",
+            "Rows returned per Supabase call.",
+            ("endpoint", "table", "operation"),
+            ROW_BUCKETS,
+        )
+        self.response_bytes = Counter(
+            "ferremix_supabase_response_bytes_total",
+            "Response payload bytes received from Supabase.",
+            ("endpoint", "table", "operation"),
+        )
+        self.query_errors = Counter(
+            "ferremix_supabase_query_errors_total",
+            "Supabase calls answered with an HTTP error status.",
+            ("endpoint", "table", "operation", "status"),
+        )
+        self.calls_per_request = Histogram(
+            "ferremix_supabase_calls_per_request",
+            "Supabase calls made while handling one request.",
+            ("endpoint",),
+            CALL_BUCKETS,
+        )
+
+    def init_app(self, app, transport):
+        self.enabled = app.config.get("METRICS_ENABLED", self.enabled)
+        self.server_timing = app.config.get("SERVER_TIMING", self.server_timing)
+        self.token = app.config.get("METRICS_TOKEN") or None
+        if not self.enabled:
+            return
+        transport.add_listener(self.record_call)
+        self.add_source("supabase_pool", transport.stats)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule("/metrics", "metrics", self.view)
+
+    def add_source(self, name, stats):
+        """Export the numeric values of ``stats()`` as ``ferremix_<name>`` gauges."""
+        self._sources.append((name, stats))
+
+    def record_call(self, upstream, response, seconds, nbytes):
+        table, operation = describe_call(upstream)
+        endpoint = "-"
+        calls = None
+        if has_request_context():
+            endpoint = request_endpoint()
+            calls = g.get("_upstream_calls")
+        rows = row_count(response)
+        with self._lock:
+            labels = (endpoint, table, operation)
+            self.query_duration.observe(labels, seconds)
+            self.response_bytes.inc(labels, nbytes)
+            if rows is not None:
+                self.query_rows.observe(labels, rows)
+            if response.status_code >= 400:
+                self.query_errors.inc(labels + (str(response.status_code),))
+        if calls is not None:
+            calls.append((table, operation, seconds))
+
+    def _start(self):
+        g._request_started = time.perf_counter()
+        g._upstream_calls = []
+
+    def _finish(self, response):
+        started = g.get("_request_started")
+        calls = g.get("_upstream_calls")
+        if started is None or calls is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request_endpoint()
+        with self._lock:
+            self.request_duration.observe(
+                (endpoint, request.method, str(response.status_code)), elapsed
+            )
+            self.calls_per_request.observe((endpoint,), len(calls))
+        if self.server_timing and _is_admin():
+            response.headers["Server-Timing"] = server_timing(calls, elapsed)
+        return response
+
+    def view(self):
+        token = request.headers.get("Authorization")
+        if not (self.token and token == f"Bearer {self.token}") and not _is_admin():
+            abort(403)
+        return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (
+                self.request_duration,
+                self.calls_per_request,
+                self.query_duration,
+                self.query_rows,
+                self.response_bytes,
+                self.query_errors,
+            ):
+                lines.extend(metric.render())
+        for name, stats in self._sources:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)):
+                    metric = f"ferremix_{name}_{key}"
+                    lines.append(f"# TYPE {metric} gauge")
+                    lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _is_admin():
+    return current_user.is_authenticated and current_user.is_admin
+
+
+def request_endpoint():
+    return request.endpoint or "unmatched"
+
+
+def server_timing(calls, elapsed):
+    """``Server-Timing`` value: one entry per table and operation, plus totals."""
+    grouped = defaultdict(lambda: [0, 0.0])
+    for table, operation, seconds in calls:
+        entry = grouped[(table, operation)]
+        entry[0] += 1
+        entry[1] += seconds
+    parts = [
+        f'{table}.{operation};dur={1000 * seconds:.1f};desc="x{count}"'
+        for (table, operation), (count, seconds) in grouped.items()
+    ]
+    db = sum(seconds for _, _, seconds in calls)
+    parts.append(f'db;dur={1000 * db:.1f};desc="{len(calls)} consultas"')
+    parts.append(f"app;dur={1000 * elapsed:.1f}")
+    return ", ".join(parts)
+
+
+metrics = Metrics()
@@ -1,9 +1,191 @@
-from extensions import supabase, login_manager
+from extensions import supabase, login_manager, gather
+from cache import (
+    request_cached,
+    request_forget,
+    catalog_cache,
+    catalog_version,
+    listing_version,
+    cart_cache,
+)
+from search_index import suggest_index
+from catalog import catalog_snapshot
 from flask_login import UserMixin
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
+import base64
+import json
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 100
+
+# Upper bounds of the price bands shown as facets on the catalog filters
+PRICE_BANDS = (500, 1000, 2500, 5000, 10000)
+
+
+class CheckoutError(Exception):
+    """Checkout rejected by the database (empty cart or not enough stock)."""
+
+    def __init__(self, reason, detail=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.detail = detail
+
+
+# Columns a product card renders, plus the ones the filters and sorts read
+_PRODUCT_CARD = "id, name, price, image_url, category_id, is_offer, stock, created_at"
+_ORDER_ROW = "id, user_id, total_amount, status, created_at"
+
+# Named column projections per table and view. Listings never carry product
+# descriptions and nothing outside the login check reads password hashes.
+PROJECTIONS = {
+    "users": {
+        "auth": "id, email, password_hash, is_admin, created_at",
+        "profile": "id, email, is_admin, created_at",
+    },
+    "categories": {
+        "default": "id, name, slug",
+        "with_products": f"id, name, slug, products({_PRODUCT_CARD})",
+    },
+    "products": {
+        "card": f"{_PRODUCT_CARD}, categories(name)",
+        "admin_row": "id, name, price, stock, category_id, is_offer, created_at, "
+        "categories(name)",
+        "detail": "*, categories(name)",
+        "suggest": "id, name, price",
+        "export": "id, name, description, price, image_url, category_id, is_offer, "
+        "stock, categories(name)",
+    },
+    "carts": {
+        "cart_line": "id, user_id, cart_items(id, product_id, quantity, "
+        "products(id, name, price, image_url, stock))",
+    },
+    "orders": {
+        "row": _ORDER_ROW,
+        "admin_row": f"{_ORDER_ROW}, users(email)",
+        "export": f"{_ORDER_ROW}, users(email), "
+        "order_shipping(full_name, address, city, phone)",
+    },
+    "order_items": {
+        "detail": "id, product_id, product_name, price_at_purchase, quantity",
+        "export": "id, order_id, product_id, product_name, price_at_purchase, "
+        "quantity, orders!inner(created_at, status)",
+    },
+    "payments": {
+        "export": "id, order_id, method, amount, status, transaction_ref, created_at",
+    },
+}
+
+
+def _fields(table, fields):
+    """Columns for ``fields``: a named projection of ``table`` or a raw list."""
+    return PROJECTIONS[table].get(fields, fields)
+
+
+# Keyset order of every paginated list: newest first, id breaks ties
+NEWEST_FIRST = (("created_at", True), ("id", True))
+# Order of date-range exports: oldest first, id breaks ties
+OLDEST_FIRST = (("created_at", False), ("id", False))
+
+# Sort modes for product listings. Each mode sorts all of its columns in the
+# same direction and ends with id, so it can also drive keyset pagination.
+PRODUCT_SORTS = {
+    "newest": {"label": "Más recientes", "order": NEWEST_FIRST},
+    "price_asc": {
+        "label": "Precio: menor a mayor",
+        "order": (("price", False), ("id", False)),
+    },
+    "price_desc": {
+        "label": "Precio: mayor a menor",
+        "order": (("price", True), ("id", True)),
+    },
+    "name": {"label": "Nombre (A-Z)", "order": (("name", False), ("id", False))},
+    "offers": {
+        "label": "Ofertas primero",
+        "order": (("is_offer", True), ("created_at", True), ("id", True)),
+    },
+}
+
+
+def _sort_order(sort):
+    return PRODUCT_SORTS[sort]["order"] if sort in PRODUCT_SORTS else None
+
+
+def _order_by(query, order):
+    for column, desc in order or ():
+        query = query.order(column, desc=desc)
+    return query
+
+
+def _encode_cursor(row, order=NEWEST_FIRST):
+    raw = json.dumps([row[column] for column, _ in order]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor, order=NEWEST_FIRST):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(order):
+        return None
+    return values
+
+
+def _literal(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _after(order, values):
+    """PostgREST ``or`` filter for rows strictly after ``values`` in ``order``."""
+    (column, desc), value = order[0], _literal(values[0])
+    clause = f"{column}.{'lt' if desc else 'gt'}.{value}"
+    if len(order) == 1:
+        return clause
+    return f"{clause},and({column}.eq.{value},or({_after(order[1:], values[1:])}))"
+
+
+def _keyset_page(query, cursor=None, limit=50, order=NEWEST_FIRST):
+    """One page of ``query`` in ``order`` plus the cursor for the next page.
+
+    The cursor holds the sort values of the last row of the previous page, so
+    each page is an index range scan instead of an ever-growing OFFSET.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    position = _decode_cursor(cursor, order) if cursor else None
+    if position:
+        query = query.or_(_after(order, position))
+    response = _order_by(query, order).limit(limit + 1).execute()
+    rows = response.data or []
+    next_cursor = _encode_cursor(rows[limit - 1], order) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _keyset_scan(make_query, order, batch_size=1000):
+    """Yield every row of ``make_query()`` in ``order``, one keyset page at a time.
+
+    ``make_query`` builds a fresh query per page (builders are mutable), and
+    only one page is held in memory, however many rows match. The scan ends
+    on an empty page, since the server's max-rows may cut pages short.
+    """
+    position = None
+    while True:
+        query = make_query()
+        if position:
+            query = query.or_(_after(order, position))
+        rows = _order_by(query, order).limit(batch_size).execute().data or []
+        if not rows:
+            return
+        yield from rows
+        position = [rows[-1][column] for column, _ in order]
+
 
 class User(UserMixin):
     def __init__(self, id, email, password_hash, is_admin=False, created_at=None):
@@ -15,25 +197,39 @@ class User(UserMixin):
 
     @staticmethod
     def get(user_id):
+        return request_cached("users", user_id, lambda: User._fetch(user_id))
+
+    @staticmethod
+    def _fetch(user_id):
         try:
-            response = supabase.table("users").select("*").eq("id", user_id).execute()
+            response = (
+                supabase.table("users")
+                .select(_fields("users", "profile"))
+                .eq("id", user_id)
+                .execute()
+            )
             if response.data:
                 data = response.data[0]
                 return User(
                     id=data["id"],
                     email=data["email"],
-                    password_hash=data["password_hash"],
+                    password_hash=None,
                     is_admin=data.get("is_admin", False),
                     created_at=data.get("created_at"),
                 )
-        except Exception as e:
-            print(f"Error getting user: {e}")
+        except Exception:
+            logger.exception("Error getting user")
         return None
 
     @staticmethod
     def get_by_email(email):
         try:
-            response = supabase.table("users").select("*").eq("email", email).execute()
+            response = (
+                supabase.table("users")
+                .select(_fields("users", "auth"))
+                .eq("email", email)
+                .execute()
+            )
             if response.data:
                 data = response.data[0]
                 return User(
@@ -43,8 +239,8 @@ class User(UserMixin):
                     is_admin=data.get("is_admin", False),
                     created_at=data.get("created_at"),
                 )
-        except Exception as e:
-            print(f"Error getting user by email: {e}")
+        except Exception:
+            logger.exception("Error getting user by email")
         return None
 
     @staticmethod
@@ -52,7 +248,7 @@ class User(UserMixin):
         try:
             response = (
                 supabase.table("users")
-                .select("*")
+                .select(_fields("users", "profile"))
                 .order("created_at", desc=True)
                 .execute()
             )
@@ -62,16 +258,39 @@ class User(UserMixin):
                     User(
                         id=data.get("id"),
                         email=data.get("email"),
-                        password_hash=data.get("password_hash"),
+                        password_hash=None,
                         is_admin=data.get("is_admin", False),
                         created_at=data.get("created_at"),
                     )
                 )
             return users
-        except Exception as e:
-            print(f"Error getting users: {e}")
+        except Exception:
+            logger.exception("Error getting users")
         return []
 
+    @staticmethod
+    def page(cursor=None, limit=50):
+        query = supabase.table("users").select(_fields("users", "profile"))
+        rows, next_cursor = _keyset_page(query, cursor, limit)
+        users = [
+            User(
+                id=data.get("id"),
+                email=data.get("email"),
+                password_hash=None,
+                is_admin=data.get("is_admin", False),
+                created_at=data.get("created_at"),
+            )
+            for data in rows
+        ]
+        return users, next_cursor
+
+    @staticmethod
+    def count(method="exact"):
+        response = (
+            supabase.table("users").select("id", count=method, head=True).execute()
+        )
+        return response.count or 0
+
     @staticmethod
     def create(email, password, is_admin=False):
         password_hash = generate_password_hash(password)
@@ -87,25 +306,27 @@ class User(UserMixin):
             response = supabase.table("users").insert(data).execute()
             if response.data:
                 return User.get(user_id)
-        except Exception as e:
-            print(f"Error creating user: {e}")
+        except Exception:
+            logger.exception("Error creating user")
         return None
 
     @staticmethod
     def update(user_id, data):
+        request_forget("users", user_id)
         try:
             response = supabase.table("users").update(data).eq("id", user_id).execute()
             return response.data[0] if response.data else None
-        except Exception as e:
-            print(f"Error updating user: {e}")
+        except Exception:
+            logger.exception("Error updating user")
         return None
 
     @staticmethod
     def delete(user_id):
+        request_forget("users", user_id)
         try:
             supabase.table("users").delete().eq("id", user_id).execute()
-        except Exception as e:
-            print(f"Error deleting user: {e}")
+        except Exception:
+            logger.exception("Error deleting user")
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -114,12 +335,32 @@ class User(UserMixin):
 class Category:
     @staticmethod
     def get_all():
-        response = supabase.table("categories").select("*").execute()
+        return catalog_cache.get(("categories",), Category._fetch_all)
+
+    @staticmethod
+    def _fetch_all():
+        response = (
+            supabase.table("categories")
+            .select(_fields("categories", "default"))
+            .execute()
+        )
         return response.data
 
+    @staticmethod
+    def count(method="exact"):
+        response = (
+            supabase.table("categories").select("id", count=method, head=True).execute()
+        )
+        return response.count or 0
+
     @staticmethod
     def get(id):
-        response = supabase.table("categories").select("*").eq("id", id).execute()
+        response = (
+            supabase.table("categories")
+            .select(_fields("categories", "default"))
+            .eq("id", id)
+            .execute()
+        )
         return response.data[0] if response.data else None
 
     @staticmethod
@@ -127,22 +368,48 @@ class Category:
         response = (
             supabase.table("categories").insert({"name": name, "slug": slug}).execute()
         )
+        Category._invalidate(response.data)
         return response.data[0] if response.data else None
 
     @staticmethod
     def update(id, data):
         response = supabase.table("categories").update(data).eq("id", id).execute()
+        Category._invalidate(response.data)
         return response.data
 
     @staticmethod
     def delete(id):
         supabase.table("categories").delete().eq("id", id).execute()
+        Category._invalidate()
+        suggest_index.remove("category", id)
+
+    @staticmethod
+    def _invalidate(rows=None):
+        # Product listings embed the category name
+        catalog_cache.invalidate("categories")
+        catalog_cache.invalidate("products")
+        catalog_version.bump()
+        listing_version.bump()
+        catalog_snapshot.invalidate()
+        for c in rows or []:
+            suggest_index.upsert("category", c["id"], c["name"])
 
 
 class Product:
     @staticmethod
-    def get_all(limit=None):
-        query = supabase.table("products").select("*, categories(name)")
+    def get_all(limit=None, sort=None, fields="card"):
+        snapshot = Product._snapshot() if fields == "card" else None
+        if snapshot is not None:
+            return snapshot.filter({}, limit, _sort_order(sort))
+        return catalog_cache.get(
+            ("products", "all", limit, sort, fields),
+            lambda: Product._fetch_all(limit, sort, fields),
+        )
+
+    @staticmethod
+    def _fetch_all(limit=None, sort=None, fields="card"):
+        query = supabase.table("products").select(_fields("products", fields))
+        query = _order_by(query, _sort_order(sort))
         if limit:
             query = query.limit(limit)
         response = query.execute()
@@ -153,11 +420,31 @@ class Product:
             products.append(p)
         return products
 
+    @staticmethod
+    def page(cursor=None, limit=50, sort=None, fields="admin_row"):
+        query = supabase.table("products").select(_fields("products", fields))
+        order = _sort_order(sort) or NEWEST_FIRST
+        products, next_cursor = _keyset_page(query, cursor, limit, order)
+        for p in products:
+            p["category"] = p["categories"] if "categories" in p else None
+        return products, next_cursor
+
+    @staticmethod
+    def count(method="exact"):
+        response = (
+            supabase.table("products").select("id", count=method, head=True).execute()
+        )
+        return response.count or 0
+
     @staticmethod
     def get(id):
+        return request_cached("products", id, lambda: Product._fetch(id))
+
+    @staticmethod
+    def _fetch(id):
         response = (
             supabase.table("products")
-            .select("*, categories(name)")
+            .select(_fields("products", "detail"))
             .eq("id", id)
             .execute()
         )
@@ -170,20 +457,236 @@ class Product:
     @staticmethod
     def create(data):
         response = supabase.table("products").insert(data).execute()
+        Product._invalidate(response.data)
         return response.data[0] if response.data else None
 
     @staticmethod
     def update(id, data):
+        request_forget("products", id)
         response = supabase.table("products").update(data).eq("id", id).execute()
+        Product._invalidate(response.data)
         return response.data
 
     @staticmethod
     def delete(id):
+        request_forget("products", id)
         supabase.table("products").delete().eq("id", id).execute()
+        Product._invalidate()
+        suggest_index.remove("product", id)
+        catalog_snapshot.remove(id)
+
+    @staticmethod
+    def existing_ids(ids):
+        """The subset of ``ids`` that are products."""
+        if not ids:
+            return set()
+        response = (
+            supabase.table("products").select("id").in_("id", list(ids)).execute()
+        )
+        return {p["id"] for p in response.data}
+
+    @staticmethod
+    def import_rows(rows):
+        """Write rows that all have the same keys, in one call.
+
+        With an ``id`` they update those products (check ``existing_ids``
+        first: an unknown id would be created and leave the ``id`` sequence
+        behind), otherwise they are inserted. Only the given columns are
+        written. Caches are left to ``invalidate_all()``.
+        """
+        table = supabase.table("products")
+        if "id" in rows[0]:
+            query = table.upsert(
+                rows,
+                on_conflict="id",
+                returning=ReturnMethod.minimal,
+                default_to_null=False,
+            )
+        else:
+            query = table.insert(
+                rows, returning=ReturnMethod.minimal, default_to_null=False
+            )
+        query.execute()
+
+    @staticmethod
+    def bulk_adjust(filters, changes, dry_run=True):
+        """Adjust every product matching ``filters`` in one ``UPDATE``.
+
+        ``changes`` may hold ``price_mode`` ("percent", "amount" or "set")
+        with ``price_value``, ``stock_mode`` ("add" or "set") with
+        ``stock_value``, and ``is_offer``. Returns how many products match
+        and up to ten of their names; with ``dry_run`` nothing is written.
+        """
+        response = supabase.rpc(
+            "bulk_adjust_products",
+            {
+                "p_query": filters.get("search"),
+                "p_category_id": filters.get("category_id"),
+                "p_min_price": filters.get("min_price"),
+                "p_max_price": filters.get("max_price"),
+                "p_is_offer": filters.get("is_offer"),
+                "p_price_mode": changes.get("price_mode"),
+                "p_price_value": changes.get("price_value"),
+                "p_stock_mode": changes.get("stock_mode"),
+                "p_stock_value": changes.get("stock_value"),
+                "p_set_offer": changes.get("is_offer"),
+                "p_dry_run": dry_run,
+            },
+        ).execute()
+        result = response.data or {}
+        count = result.get("count", 0)
+        if count and not dry_run:
+            Product.invalidate_all()
+        return count, result.get("sample", [])
+
+    @staticmethod
+    def invalidate_all():
+        """Invalidate everything derived from products once, after bulk writes."""
+        catalog_cache.invalidate("products")
+        catalog_version.bump()
+        listing_version.bump()
+        catalog_snapshot.invalidate()
+        suggest_index.invalidate()
+
+    @staticmethod
+    def _invalidate(rows=None):
+        catalog_cache.invalidate("products")
+        catalog_version.bump()
+        listing_version.bump()
+        catalog_snapshot.upsert(rows or [])
+        for p in rows or []:
+            suggest_index.upsert("product", p["id"], p["name"], price=p.get("price"))
 
     @staticmethod
-    def filter(filters, limit=None):
-        query = supabase.table("products").select("*, categories(name)")
+    def _snapshot():
+        """Columnar in-process catalog, or None when CATALOG_SNAPSHOT is off."""
+        return catalog_snapshot.current(Product._snapshot_rows)
+
+    @staticmethod
+    def _snapshot_rows():
+        for p in Product.iter_all("card"):
+            p["category"] = p["categories"] if "categories" in p else None
+            yield p
+
+    @staticmethod
+    def iter_all(fields="detail", batch_size=1000):
+        """Yield every product in id order, one bounded page at a time."""
+        return _keyset_scan(
+            lambda: supabase.table("products").select(_fields("products", fields)),
+            (("id", False),),
+            batch_size,
+        )
+
+    @staticmethod
+    def search(term, filters=None, limit=48, sort=None, fields="card"):
+        """Relevance-ranked search over name and description.
+
+        Accent-insensitive and prefix-matching per word, backed by the
+        ``search_products`` function and its GIN indexes. A ``sort`` from
+        ``PRODUCT_SORTS`` replaces relevance order.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if k != "search"}
+        key = (
+            "products",
+            "search",
+            term,
+            tuple(sorted(filters.items())),
+            limit,
+            sort,
+            fields,
+        )
+        return catalog_cache.get(
+            key, lambda: Product._fetch_search(term, filters, limit, sort, fields)
+        )
+
+    @staticmethod
+    def _fetch_search(term, filters, limit, sort=None, fields="card"):
+        query = supabase.rpc(
+            "search_products",
+            {
+                "p_query": term,
+                "p_category_id": filters.get("category_id"),
+                "p_min_price": filters.get("min_price"),
+                "p_max_price": filters.get("max_price"),
+                "p_is_offer": filters.get("is_offer"),
+                "p_limit": limit,
+                "p_sort": sort if sort in PRODUCT_SORTS else None,
+            },
+        ).select(_fields("products", fields))
+        response = _order_by(query, _sort_order(sort)).execute()
+        products = []
+        for p in response.data:
+            p["category"] = p["categories"] if "categories" in p else None
+            products.append(p)
+        return products
+
+    @staticmethod
+    def facets(filters, bands=PRICE_BANDS):
+        """Per-category and per-price-band counts for the current filters.
+
+        Each facet ignores its own filter, so the sidebar shows how many
+        products a click would yield. Computed in one ``product_facets`` call.
+        """
+        snapshot = None if filters.get("search") else Product._snapshot()
+        if snapshot is not None:
+            return snapshot.facets(filters, bands)
+        key = ("products", "facets", tuple(sorted(filters.items())), bands)
+        return catalog_cache.get(key, lambda: Product._fetch_facets(filters, bands))
+
+    @staticmethod
+    def _fetch_facets(filters, bands):
+        response = supabase.rpc(
+            "product_facets",
+            {
+                "p_query": filters.get("search"),
+                "p_category_id": filters.get("category_id"),
+                "p_min_price": filters.get("min_price"),
+                "p_max_price": filters.get("max_price"),
+                "p_is_offer": filters.get("is_offer"),
+                "p_bands": list(bands),
+            },
+        ).execute()
+        data = response.data or {}
+        categories = {
+            int(k) if k else None: v for k, v in data.get("categories", {}).items()
+        }
+        band_counts = {int(k): v for k, v in data.get("bands", {}).items()}
+        # width_bucket numbering: 0 is below the first bound, len(bands) above the last
+        bounds = (None,) + tuple(bands) + (None,)
+        price_bands = []
+        for i in range(len(bands) + 1):
+            if band_counts.get(i):
+                price_bands.append(
+                    {"min": bounds[i], "max": bounds[i + 1], "count": band_counts[i]}
+                )
+        return {
+            "categories": categories,
+            "total": sum(categories.values()),
+            "price_bands": price_bands,
+        }
+
+    @staticmethod
+    def filter(filters, limit=None, sort=None, fields="card"):
+        if filters.get("search"):
+            return Product.search(filters["search"], filters, limit or 48, sort, fields)
+        snapshot = Product._snapshot() if fields == "card" else None
+        if snapshot is not None:
+            return snapshot.filter(filters, limit, _sort_order(sort))
+        key = (
+            "products",
+            "filter",
+            tuple(sorted(filters.items())),
+            limit,
+            sort,
+            fields,
+        )
+        return catalog_cache.get(
+            key, lambda: Product._fetch_filtered(filters, limit, sort, fields)
+        )
+
+    @staticmethod
+    def _fetch_filtered(filters, limit=None, sort=None, fields="card"):
+        query = supabase.table("products").select(_fields("products", fields))
 
         if "is_offer" in filters:
             query = query.eq("is_offer", filters["is_offer"])
@@ -193,9 +696,8 @@ class Product:
             query = query.gte("price", filters["min_price"])
         if "max_price" in filters and filters["max_price"]:
             query = query.lte("price", filters["max_price"])
-        if "search" in filters and filters["search"]:
-            query = query.ilike("name", f"%{filters['search']}%")
 
+        query = _order_by(query, _sort_order(sort))
         if limit:
             query = query.limit(limit)
 
@@ -206,27 +708,55 @@ class Product:
             products.append(p)
         return products
 
+    @staticmethod
+    def top_n_per_category(n=4):
+        """Every category with up to ``n`` of its products, in one round-trip."""
+        return catalog_cache.get(
+            ("products", "top_n", n), lambda: Product._fetch_top_n(n)
+        )
+
+    @staticmethod
+    def _fetch_top_n(n):
+        response = (
+            supabase.table("categories")
+            .select(_fields("categories", "with_products"))
+            .limit(n, foreign_table="products")
+            .execute()
+        )
+        categories = []
+        for cat in response.data:
+            cat["products"] = cat.get("products") or []
+            for p in cat["products"]:
+                p["category"] = {"name": cat["name"]}
+            categories.append(cat)
+        return categories
+
 
 class Cart:
     @staticmethod
     def get_user_cart(user_id):
-        # First check if cart exists
-        response = supabase.table("carts").select("*").eq("user_id", user_id).execute()
-        if not response.data:
-            # Create cart
-            response = supabase.table("carts").insert({"user_id": user_id}).execute()
+        return request_cached("carts", user_id, lambda: Cart._fetch(user_id))
 
-        cart = response.data[0]
-        # Get items
-        items_response = (
-            supabase.table("cart_items")
-            .select("*, products(*)")
-            .eq("cart_id", cart["id"])
+    @staticmethod
+    def _fetch(user_id):
+        # Cart and items in one call; the cart is only created when missing
+        response = (
+            supabase.table("carts")
+            .select(_fields("carts", "cart_line"))
+            .eq("user_id", user_id)
             .execute()
         )
+        if not response.data:
+            # Upsert on unique_user_cart so concurrent first visits don't collide
+            response = (
+                supabase.table("carts")
+                .upsert({"user_id": user_id}, on_conflict="user_id")
+                .execute()
+            )
 
+        cart = response.data[0]
         cart["items"] = []
-        for item in items_response.data:
+        for item in cart.pop("cart_items", None) or []:
             # Flatten product structure
             item["product"] = item["products"]
             cart["items"].append(item)
@@ -234,90 +764,126 @@ class Cart:
         return cart
 
     @staticmethod
-    def add_item(cart_id, product_id, quantity):
-        # Check if item exists in cart
+    def count(user_id):
+        """Badge count for the header; reads only ``quantity`` and is cached."""
+        return cart_cache.get(("count", str(user_id)), lambda: Cart._count(user_id))
+
+    @staticmethod
+    def _count(user_id):
         response = (
             supabase.table("cart_items")
-            .select("*")
-            .eq("cart_id", cart_id)
-            .eq("product_id", product_id)
+            .select("quantity, carts!inner(user_id)")
+            .eq("carts.user_id", user_id)
             .execute()
         )
+        return sum(item["quantity"] for item in response.data or [])
 
-        if response.data:
-            # Update quantity
-            new_qty = response.data[0]["quantity"] + int(quantity)
-            supabase.table("cart_items").update({"quantity": new_qty}).eq(
-                "id", response.data[0]["id"]
-            ).execute()
-        else:
-            # Insert new item
-            supabase.table("cart_items").insert(
-                {"cart_id": cart_id, "product_id": product_id, "quantity": quantity}
-            ).execute()
+    @staticmethod
+    def _changed(user_id=None):
+        request_forget("carts")
+        if user_id is not None:
+            cart_cache.delete(("count", str(user_id)))
+            cart_cache.delete(("summary", str(user_id)))
+
+    @staticmethod
+    def add_item(cart_id, product_id, quantity, user_id=None):
+        supabase.rpc(
+            "add_cart_item",
+            {
+                "p_cart_id": cart_id,
+                "p_product_id": product_id,
+                "p_quantity": int(quantity),
+            },
+        ).execute()
+        Cart._changed(user_id)
+
+    @staticmethod
+    def add_item_for_user(user_id, product_id, quantity):
+        """Create the user's cart if needed and add the product, in one call."""
+        supabase.rpc(
+            "add_user_cart_item",
+            {
+                "p_user_id": user_id,
+                "p_product_id": product_id,
+                "p_quantity": int(quantity),
+            },
+        ).execute()
+        Cart._changed(user_id)
 
     @staticmethod
-    def update_item_quantity(item_id, quantity):
+    def update_item_quantity(item_id, quantity, user_id=None):
         supabase.table("cart_items").update({"quantity": quantity}).eq(
             "id", item_id
         ).execute()
+        Cart._changed(user_id)
 
     @staticmethod
-    def remove_item(item_id):
+    def remove_item(item_id, user_id=None):
         supabase.table("cart_items").delete().eq("id", item_id).execute()
+        Cart._changed(user_id)
 
     @staticmethod
-    def clear(cart_id):
+    def clear(cart_id, user_id=None):
         supabase.table("cart_items").delete().eq("cart_id", cart_id).execute()
+        Cart._changed(user_id)
 
 
 class Order:
     @staticmethod
-    def create(user_id, total_amount, items):
-        # Create Order
-        order_data = {
-            "user_id": user_id,
-            "total_amount": total_amount,
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat(),
-        }
-        order_res = supabase.table("orders").insert(order_data).execute()
-        order = order_res.data[0]
+    def checkout(user_id, shipping, payment_method, transaction_ref=None):
+        """Place the user's cart as an order in one server-side transaction.
 
-        # Create Order Items
-        order_items = []
-        for item in items:
-            order_items.append(
+        Creates the order, its items, shipping and payment, decrements stock and
+        clears the cart. Returns the order with ``items``, ``shipping`` and
+        ``payment`` attached.
+        """
+        try:
+            response = supabase.rpc(
+                "checkout_cart",
                 {
-                    "order_id": order["id"],
-                    "product_id": item["product"]["id"],
-                    "product_name": item["product"]["name"],
-                    "quantity": item["quantity"],
-                    "price_at_purchase": item["product"]["price"],
-                }
-            )
-
-        if order_items:
-            supabase.table("order_items").insert(order_items).execute()
-
-        return order
+                    "p_user_id": user_id,
+                    "p_shipping": shipping,
+                    "p_payment_method": payment_method,
+                    "p_transaction_ref": transaction_ref,
+                },
+            ).execute()
+        except APIError as e:
+            reason, _, detail = (e.message or "").partition(":")
+            if reason in ("empty_cart", "insufficient_stock"):
+                raise CheckoutError(reason, detail.strip() or None) from e
+            raise
+        Cart._changed(user_id)
+        # Only the purchased products' stock changed: patch the snapshot and
+        # forget those products. Listings don't show stock, so they and the
+        # catalog version stay; the caller drops the detail pages.
+        items = response.data.get("items") or []
+        catalog_snapshot.adjust_stock(items)
+        for item in items:
+            request_forget("products", item["product_id"])
+        return response.data
 
     @staticmethod
     def get_by_user(user_id):
         response = (
             supabase.table("orders")
-            .select("*")
+            .select(_fields("orders", "row"))
             .eq("user_id", user_id)
             .order("created_at", desc=True)
             .execute()
         )
         return response.data
 
+    @staticmethod
+    def page_by_user(user_id, cursor=None, limit=20):
+        query = supabase.table("orders").select(_fields("orders", "row"))
+        query = query.eq("user_id", user_id)
+        return _keyset_page(query, cursor, limit)
+
     @staticmethod
     def get_all():
         response = (
             supabase.table("orders")
-            .select("*, users(email)")
+            .select(_fields("orders", "admin_row"))
             .order("created_at", desc=True)
             .execute()
         )
@@ -328,55 +894,83 @@ class Order:
         return orders
 
     @staticmethod
-    def get(id):
+    def page(cursor=None, limit=50):
+        query = supabase.table("orders").select(_fields("orders", "admin_row"))
+        orders, next_cursor = _keyset_page(query, cursor, limit)
+        for o in orders:
+            o["user"] = o["users"] if "users" in o else None
+        return orders, next_cursor
+
+    @staticmethod
+    def count(method="exact"):
         response = (
-            supabase.table("orders").select("*, users(email)").eq("id", id).execute()
+            supabase.table("orders").select("id", count=method, head=True).execute()
         )
-        if not response.data:
-            return None
-        order = response.data[0]
-        order["user"] = order["users"] if "users" in order else None
+        return response.count or 0
 
-        # Get items
-        items_res = (
+    @staticmethod
+    def stats():
+        """Order count and revenue per status, aggregated in Postgres."""
+        response = supabase.rpc("order_stats", {}).execute()
+        return response.data or []
+
+    @staticmethod
+    def get(id):
+        order_query = (
+            supabase.table("orders").select(_fields("orders", "admin_row")).eq("id", id)
+        )
+        items_query = (
             supabase.table("order_items")
-            .select("*")
-            .eq("order_id", order["id"])
-            .execute()
+            .select(_fields("order_items", "detail"))
+            .eq("order_id", id)
         )
+        order_res, items_res = gather(order_query.execute, items_query.execute)
+        if not order_res.data:
+            return None
+        order = order_res.data[0]
+        order["user"] = order["users"] if "users" in order else None
         order["items"] = items_res.data
 
         return order
 
     @staticmethod
-    def update_status(id, status):
-        supabase.table("orders").update({"status": status}).eq("id", id).execute()
+    def iter_range(start, end, batch_size=1000):
+        """Orders created in ``[start, end)``, with customer and shipping."""
+        return _keyset_scan(
+            lambda: supabase.table("orders")
+            .select(_fields("orders", "export"))
+            .gte("created_at", start)
+            .lt("created_at", end),
+            OLDEST_FIRST,
+            batch_size,
+        )
 
+    @staticmethod
+    def iter_items(start, end, batch_size=1000):
+        """Items of the orders created in ``[start, end)``, by order."""
+        return _keyset_scan(
+            lambda: supabase.table("order_items")
+            .select(_fields("order_items", "export"))
+            .gte("orders.created_at", start)
+            .lt("orders.created_at", end),
+            (("order_id", False), ("id", False)),
+            batch_size,
+        )
 
-class OrderShipping:
     @staticmethod
-    def create(order_id, data):
-        payload = {
-            "order_id": order_id,
-            "full_name": data.get("full_name"),
-            "address": data.get("address"),
-            "city": data.get("city"),
-            "phone": data.get("phone"),
-            "notes": data.get("notes"),
-        }
-        response = supabase.table("order_shipping").insert(payload).execute()
-        return response.data[0] if response.data else None
+    def update_status(id, status):
+        supabase.table("orders").update({"status": status}).eq("id", id).execute()
 
 
 class Payment:
     @staticmethod
-    def create(order_id, amount, method, status="paid", transaction_ref=None):
-        payload = {
-            "order_id": order_id,
-            "amount": amount,
-            "method": method,
-            "status": status,
-            "transaction_ref": transaction_ref,
-        }
-        response = supabase.table("payments").insert(payload).execute()
-        return response.data[0] if response.data else None
+    def iter_range(start, end, batch_size=1000):
+        """Payments made in ``[start, end)``, oldest first."""
+        return _keyset_scan(
+            lambda: supabase.table("payments")
+            .select(_fields("payments", "export"))
+            .gte("created_at", start)
+            .lt("created_at", end),
+            OLDEST_FIRST,
+            batch_size,
+        )
@@ -0,0 +1,351 @@
+import csv
+import io
+import itertools
+import json
+import re
+import time
+from decimal import Decimal, InvalidOperation
+
+from postgrest.exceptions import APIError
+
+from extensions import gather
+from models import Category, Product
+
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+# Imports also accept a JSON array of objects
+IMPORT_FORMATS = ("csv", "jsonl", "json")
+
+# Columns of an export, which is also a valid import file. ``category`` is
+# the category name and is only read when ``category_id`` is empty.
+EXPORT_COLUMNS = (
+    "id",
+    "name",
+    "description",
+    "price",
+    "image_url",
+    "category_id",
+    "category",
+    "is_offer",
+    "stock",
+)
+
+# Per-row errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+_TRUE = {"1", "true", "t", "yes", "y", "si", "sí", "x"}
+_FALSE = {"0", "false", "f", "no", "n"}
+
+
+# Largest single JSON array element accepted while streaming
+MAX_JSON_ELEMENT = 1 << 20
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class RowError(ValueError):
+    pass
+
+
+class FileError(ValueError):
+    """The file can't be read any further; rows read so far still count."""
+
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "json" if name.endswith(".json") else "csv"
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line, row)`` from a binary upload without loading it whole.
+
+    For a JSON array ``line`` is the element's position in the array.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "json":
+        yield from _json_array(text)
+        return
+    if fmt == "jsonl":
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_no, row if isinstance(row, dict) else None
+        return
+
+    header = text.readline()
+    try:
+        # Spreadsheets in Spanish locales export with ";"
+        dialect = csv.Sniffer().sniff(header, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(itertools.chain([header], text), dialect=dialect)
+    for row in reader:
+        yield reader.line_num, {
+            (k or "").strip().lower(): (v.strip() if isinstance(v, str) else v)
+            for k, v in row.items()
+        }
+
+
+def _json_array(text, chunk_size=1 << 16):
+    """Yield ``(position, row)`` per element of a top-level JSON array.
+
+    Elements are decoded one at a time from a sliding buffer; an element is
+    only taken once more input follows it, so a chunk boundary never cuts
+    one short.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    state, position = "open", 0
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer) and not eof:
+            chunk = text.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+        if state == "value":
+            try:
+                row, end = decoder.raw_decode(buffer, pos)
+                complete = end < len(buffer) or eof
+            except ValueError:
+                if eof:
+                    raise FileError(f"elemento {position + 1} no es JSON válido")
+                complete = False
+            if not complete:
+                if len(buffer) - pos > MAX_JSON_ELEMENT:
+                    raise FileError(f"elemento {position + 1} demasiado grande")
+                chunk = text.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            position += 1
+            yield position, row if isinstance(row, dict) else None
+            pos, state = end, "next"
+            continue
+        if pos == len(buffer):
+            raise FileError("el arreglo JSON no está cerrado")
+        char = buffer[pos]
+        pos += 1
+        if state == "open" and char == "[":
+            state = "first"
+        elif state in ("first", "next") and char == "]":
+            return
+        elif state == "first":
+            pos, state = pos - 1, "value"
+        elif state == "next" and char == ",":
+            state = "value"
+        elif state == "open":
+            raise FileError(
+                "un archivo .json debe contener un arreglo de objetos; "
+                "usa .jsonl para JSON Lines"
+            )
+        else:
+            raise FileError(f"se esperaba ',' o ']' tras el elemento {position}")
+
+
+def _text(value, limit=None):
+    value = "" if value is None else str(value).strip()
+    if limit and len(value) > limit:
+        raise RowError(f"supera {limit} caracteres")
+    return value or None
+
+
+def _number(value, name, integer=False):
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise RowError(f"{name} inválido: {value!r}")
+    if not number.is_finite() or number < 0:
+        raise RowError(f"{name} inválido: {value!r}")
+    if integer:
+        if number != number.to_integral_value():
+            raise RowError(f"{name} debe ser entero: {value!r}")
+        return int(number)
+    return float(round(number, 2))
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise RowError(f"is_offer inválido: {value!r}")
+
+
+def _present(row, key):
+    return row.get(key) not in (None, "")
+
+
+def category_lookup():
+    """Category ids by id, lower-cased name and slug."""
+    lookup = {}
+    for c in Category.get_all():
+        lookup[str(c["id"])] = c["id"]
+        lookup[c["name"].strip().lower()] = c["id"]
+        if c.get("slug"):
+            lookup[c["slug"].strip().lower()] = c["id"]
+    return lookup
+
+
+def parse_row(row, categories):
+    """Validated ``products`` columns for one input row.
+
+    ``name`` and ``price`` are required; optional columns left empty are
+    omitted so an update keeps their current value.
+    """
+    if row is None:
+        raise RowError("no es un objeto JSON")
+    data = {}
+    if _present(row, "id"):
+        data["id"] = _number(row["id"], "id", integer=True)
+    name = _text(row.get("name"), limit=255)
+    if not name:
+        raise RowError("falta el nombre")
+    data["name"] = name
+    if not _present(row, "price"):
+        raise RowError("falta el precio")
+    data["price"] = _number(row["price"], "precio")
+    if _present(row, "stock"):
+        data["stock"] = _number(row["stock"], "stock", integer=True)
+    if _present(row, "is_offer"):
+        data["is_offer"] = _flag(row["is_offer"])
+    for key in ("description", "image_url"):
+        if _present(row, key):
+            data[key] = _text(row[key])
+
+    category = row.get("category_id")
+    if not _present(row, "category_id"):
+        category = row.get("category")
+    if category not in (None, ""):
+        category_id = categories.get(str(category).strip().lower())
+        if category_id is None:
+            raise RowError(f"categoría desconocida: {category!r}")
+        data["category_id"] = category_id
+    return data
+
+
+class ImportReport:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.processed = 0
+        self.written = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed else 0.0
+
+
+def _write_batch(batch):
+    """Send one batch; returns ``(line, error message or None)`` per row.
+
+    Rows are written in one call per set of keys, so a rejected call only
+    fails its own rows.
+    """
+    results = {}
+    ids = {data["id"] for _, data in batch if "id" in data}
+    try:
+        existing = Product.existing_ids(ids)
+    except APIError as e:
+        message = f"rechazada por la base de datos: {e.message or e}"
+        return [(line, message) for line, _ in batch]
+    groups = {}
+    for line, data in batch:
+        if "id" in data and data["id"] not in existing:
+            results[line] = f"no existe un producto con id {data['id']}"
+        else:
+            groups.setdefault(tuple(sorted(data)), []).append((line, data))
+    for group in groups.values():
+        try:
+            Product.import_rows([data for _, data in group])
+            message = None
+        except APIError as e:
+            message = f"rechazada por la base de datos: {e.message or e}"
+        for line, _ in group:
+            results[line] = message
+    return [(line, results[line]) for line, _ in batch]
+
+
+def import_products(stream, fmt="csv", batch_size=500, concurrency=4):
+    """Validate and write products from ``stream``, yielding progress.
+
+    Rows are written in batches of ``batch_size``, ``concurrency`` batches
+    at a time through ``gather``, so at most ``batch_size * concurrency``
+    rows are held in memory. The report is yielded after every round and
+    once more at the end; caches are invalidated once, when done.
+    """
+    report = ImportReport()
+    categories = category_lookup()
+    batches, batch = [], []
+
+    def flush():
+        results = gather(*[lambda b=b: _write_batch(b) for b in batches])
+        for outcomes in results:
+            for line, message in outcomes:
+                if message is None:
+                    report.written += 1
+                else:
+                    report.error(line, message)
+        batches.clear()
+
+    try:
+        try:
+            for line, row in read_rows(stream, fmt):
+                report.processed += 1
+                try:
+                    batch.append((line, parse_row(row, categories)))
+                except RowError as e:
+                    report.error(line, str(e))
+                    continue
+                if len(batch) >= batch_size:
+                    batches.append(batch)
+                    batch = []
+                    if len(batches) >= concurrency:
+                        flush()
+                        yield report
+        except (UnicodeDecodeError, csv.Error, FileError) as e:
+            # Rows read so far are still written
+            report.error(None, f"archivo ilegible: {e}")
+        if batch:
+            batches.append(batch)
+        if batches:
+            flush()
+    finally:
+        if report.written:
+            Product.invalidate_all()
+    yield report
+
+
+def export_products(fmt="csv", batch_size=1000):
+    """Stream the whole catalog as CSV or JSON Lines text chunks."""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+    for i, p in enumerate(Product.iter_all("export", batch_size), 1):
+        category = p.pop("categories", None)
+        p["category"] = category["name"] if category else None
+        if writer:
+            writer.writerow(p)
+        else:
+            row = {column: p.get(column) for column in EXPORT_COLUMNS}
+            buffer.write(json.dumps(row, ensure_ascii=False) + "\n")
+        if i % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,233 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, request
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"collapsed": ".collapsed", "speedscope": ".speedscope.json"}
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+class _Profile:
+    def __init__(self, endpoint, explicit):
+        self.endpoint = endpoint
+        self.explicit = explicit
+        self.started = time.perf_counter()
+        self.threads = {threading.get_ident()}
+        self.stacks = Counter()
+        self.path = None
+
+
+def _stack(frame):
+    """(name, file, line) frames of ``frame``'s stack, outermost first."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _label(name, filename, line):
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class RequestProfiler:
+    """Sampling profiler for single requests, written as flamegraph files.
+
+    A request is profiled when an admin sends ``X-Profile: 1`` (or
+    ``?_profile=1``), or when ``PROFILE_SLOW_MS`` is set and the request
+    turns out slower than that. One daemon thread samples the stacks of the
+    profiled requests' threads (fan-out workers included) from
+    ``sys._current_frames()`` every ``PROFILE_INTERVAL_MS``; with neither
+    trigger configured nothing is registered and the thread never starts.
+    """
+
+    def __init__(self):
+        self.slow_ms = 0
+        self.interval = 0.005
+        self.directory = "profiles"
+        self.format = "collapsed"
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.slow_ms = app.config.get("PROFILE_SLOW_MS", self.slow_ms)
+        self.interval = app.config.get("PROFILE_INTERVAL_MS", 5) / 1000
+        self.directory = app.config.get("PROFILE_DIR", self.directory)
+        self.format = app.config.get("PROFILE_FORMAT", self.format)
+        if self.format not in FORMATS:
+            logger.warning("Unknown PROFILE_FORMAT %r; using collapsed", self.format)
+            self.format = "collapsed"
+        app.before_request(self._start)
+        app.after_request(self._add_header)
+        app.teardown_request(self._finish)
+
+    def _requested(self):
+        # current_user (a Supabase lookup) is only resolved for flagged requests
+        flag = request.headers.get("X-Profile") or request.args.get("_profile")
+        return flag == "1" and current_user.is_authenticated and current_user.is_admin
+
+    def _start(self):
+        explicit = self._requested()
+        if not explicit and not self.slow_ms:
+            return
+        profile = _Profile(request.endpoint or "unmatched", explicit)
+        if explicit:
+            profile.path = self._path(profile)
+        g._profile = profile
+        g._profile_token = _current_profile.set(profile)
+        with self._lock:
+            self._active[id(profile)] = profile
+            self._ensure_thread()
+        self._wake.set()
+
+    def _add_header(self, response):
+        profile = g.get("_profile")
+        if profile is not None and profile.explicit:
+            response.headers["X-Profile-File"] = os.path.basename(profile.path)
+        return response
+
+    def _finish(self, exc=None):
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return
+        # Threads reused for later requests must not inherit this profile
+        _current_profile.reset(g.pop("_profile_token"))
+        with self._lock:
+            self._active.pop(id(profile), None)
+        elapsed_ms = 1000 * (time.perf_counter() - profile.started)
+        if not profile.explicit and elapsed_ms < self.slow_ms:
+            return
+        if not profile.stacks and not profile.explicit:
+            return
+        path = profile.path or self._path(profile, elapsed_ms)
+        try:
+            self.write(profile, path, elapsed_ms)
+        except OSError:
+            logger.exception("Could not write profile %s", path)
+        else:
+            logger.info(
+                "Profile of %s (%.0f ms) written to %s",
+                profile.endpoint,
+                elapsed_ms,
+                path,
+            )
+
+    @contextmanager
+    def following(self):
+        """Sample the current thread as part of the caller's profile, if any.
+
+        ``gather`` runs each fan-out call inside this, so work done in the
+        executor shows up in the request's flamegraph.
+        """
+        profile = _current_profile.get()
+        if profile is None:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            profile.threads.add(ident)
+        try:
+            yield
+        finally:
+            with self._lock:
+                profile.threads.discard(ident)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._sample_forever, name="request-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def _sample_forever(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                targets = [
+                    (profile, tuple(profile.threads))
+                    for profile in self._active.values()
+                ]
+                if not targets:
+                    self._wake.clear()
+            if not targets:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            samples = [
+                (profile, _stack(frames[ident]))
+                for profile, threads in targets
+                for ident in threads
+                if ident in frames and ident != me
+            ]
+            del frames
+            with self._lock:
+                # A request that finished meanwhile is being written out
+                for profile, stack in samples:
+                    if id(profile) in self._active:
+                        profile.stacks[stack] += 1
+            time.sleep(self.interval)
+
+    def _path(self, profile, elapsed_ms=None):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        name = f"{stamp}-{profile.endpoint.replace('.', '-')}"
+        if elapsed_ms is not None:
+            name += f"-{elapsed_ms:.0f}ms"
+        return os.path.join(self.directory, name + FORMATS[self.format])
+
+    def write(self, profile, path, elapsed_ms):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            if self.format == "speedscope":
+                json.dump(self._speedscope(profile, elapsed_ms), f)
+            else:
+                for stack, count in profile.stacks.most_common():
+                    f.write(";".join(_label(*frame) for frame in stack))
+                    f.write(f" {count}\n")
+
+    def _speedscope(self, profile, elapsed_ms):
+        frames, index, samples, weights = [], {}, [], []
+        for stack, count in profile.stacks.items():
+            sample = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    name, filename, line = frame
+                    frames.append({"name": name, "file": filename, "line": line})
+                sample.append(index[frame])
+            samples.append(sample)
+            weights.append(count * self.interval * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"{profile.endpoint} ({elapsed_ms:.0f} ms)",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "exporter": "ferremix",
+        }
+
+
+request_profiler = RequestProfiler()
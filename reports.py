@@ -0,0 +1,132 @@
+import csv
+import io
+
+from models import Order, Payment
+
+# Leading characters that make spreadsheets read a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _one(value):
+    # One-to-one embeds may come back as a single-element list
+    if isinstance(value, list):
+        return value[0] if value else {}
+    return value or {}
+
+
+def _order_row(o):
+    shipping = _one(o.get("order_shipping"))
+    return (
+        o["id"],
+        o["created_at"],
+        o.get("status"),
+        o["total_amount"],
+        _one(o.get("users")).get("email"),
+        shipping.get("full_name"),
+        shipping.get("address"),
+        shipping.get("city"),
+        shipping.get("phone"),
+    )
+
+
+def _item_row(i):
+    order = _one(i.get("orders"))
+    subtotal = round(float(i["price_at_purchase"]) * i["quantity"], 2)
+    return (
+        i["order_id"],
+        order.get("created_at"),
+        order.get("status"),
+        i["id"],
+        i.get("product_id"),
+        i["product_name"],
+        i["quantity"],
+        i["price_at_purchase"],
+        subtotal,
+    )
+
+
+def _payment_row(p):
+    return (
+        p["id"],
+        p["order_id"],
+        p["created_at"],
+        p["method"],
+        p.get("status"),
+        p["amount"],
+        p.get("transaction_ref"),
+    )
+
+
+# Date-range CSV reports: label, header, row source and row formatter
+REPORTS = {
+    "orders": (
+        "Órdenes",
+        (
+            "orden",
+            "fecha",
+            "estado",
+            "total",
+            "cliente",
+            "nombre",
+            "dirección",
+            "ciudad",
+            "teléfono",
+        ),
+        Order.iter_range,
+        _order_row,
+    ),
+    "items": (
+        "Ítems vendidos",
+        (
+            "orden",
+            "fecha",
+            "estado",
+            "ítem",
+            "producto_id",
+            "producto",
+            "cantidad",
+            "precio",
+            "subtotal",
+        ),
+        Order.iter_items,
+        _item_row,
+    ),
+    "payments": (
+        "Pagos",
+        ("pago", "orden", "fecha", "método", "estado", "monto", "referencia"),
+        Payment.iter_range,
+        _payment_row,
+    ),
+}
+
+
+def _cell(value):
+    """Text Excel would evaluate as a formula, quoted with a leading "'"."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_stream(header, rows, chunk_rows=500):
+    """CSV text in chunks of ``chunk_rows`` rows, with a BOM so Excel reads UTF-8.
+
+    Text cells hold customer input (shipping name, address, phone), so
+    formula-like values are neutralized with ``_cell``.
+    """
+    buffer = io.StringIO()
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_cell(value) for value in row])
+        if i % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export(report, start, end):
+    """Stream ``report`` for rows dated in ``[start, end)`` as CSV."""
+    _, header, source, formatter = REPORTS[report]
+    return csv_stream(header, map(formatter, source(start, end)))
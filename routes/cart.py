@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from models import Product, Cart, Order, OrderShipping, Payment
+from models import Product, Cart, Order, CheckoutError
+from cache import cart_cache, forget_pages
 
 cart_bp = Blueprint("cart", __name__)
 
@@ -36,9 +37,19 @@ def _build_cart_summary(user_id=None):
 @cart_bp.route("/summary")
 def cart_summary():
     if not current_user.is_authenticated:
-        return jsonify(_build_cart_summary())
+        summary = _build_cart_summary()
+    else:
+        summary = cart_cache.get(
+            ("summary", str(current_user.id)),
+            lambda: _build_cart_summary(current_user.id),
+        )
 
-    return jsonify(_build_cart_summary(current_user.id))
+    # Polling clients revalidate with If-None-Match and get a bodyless 304
+    response = jsonify(summary)
+    response.add_etag()
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response.make_conditional(request)
 
 
 @cart_bp.route("/")
@@ -67,8 +78,7 @@ def add_to_cart(product_id):
         flash("No hay suficiente stock.", "warning")
         return redirect(url_for("main.product_detail", id=product_id))
 
-    cart = Cart.get_user_cart(current_user.id)
-    Cart.add_item(cart["id"], product_id, quantity)
+    Cart.add_item_for_user(current_user.id, product_id, quantity)
 
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         return jsonify(_build_cart_summary(current_user.id))
@@ -82,10 +92,10 @@ def add_to_cart(product_id):
 def update_item(item_id):
     quantity = int(request.form.get("quantity"))
     if quantity > 0:
-        Cart.update_item_quantity(item_id, quantity)
+        Cart.update_item_quantity(item_id, quantity, user_id=current_user.id)
         flash("Carrito actualizado.", "success")
     else:
-        Cart.remove_item(item_id)
+        Cart.remove_item(item_id, user_id=current_user.id)
         flash("Ítem eliminado.", "info")
     return redirect(url_for("cart.view_cart"))
 
@@ -93,7 +103,7 @@ def update_item(item_id):
 @cart_bp.route("/remove/<int:item_id>", methods=["POST"])
 @login_required
 def remove_item(item_id):
-    Cart.remove_item(item_id)
+    Cart.remove_item(item_id, user_id=current_user.id)
     flash("Producto eliminado del carrito.", "success")
     return redirect(url_for("cart.view_cart"))
 
@@ -131,22 +141,23 @@ def checkout():
             flash("Completa los datos de envío y pago.", "warning")
             return redirect(url_for("cart.checkout"))
 
-        # Create Order
-        order = Order.create(current_user.id, total, cart["items"])
-
-        # Save shipping & payment (simulado)
-        OrderShipping.create(order["id"], shipping_data)
-        Payment.create(
-            order["id"],
-            total,
-            payment_method,
-            status="paid",
-            transaction_ref=transaction_ref,
+        # Order, items, shipping, payment, stock and cart clear in one call
+        try:
+            order = Order.checkout(
+                current_user.id, shipping_data, payment_method, transaction_ref
+            )
+        except CheckoutError as e:
+            if e.reason == "insufficient_stock":
+                flash(f"No hay suficiente stock para: {e.detail}.", "warning")
+            else:
+                flash("Tu carrito está vacío.", "warning")
+            return redirect(url_for("cart.view_cart"))
+        # Their detail pages show the stock that just changed
+        forget_pages(
+            url_for("main.product_detail", id=item["product_id"])
+            for item in order["items"]
         )
 
-        # Clear Cart
-        Cart.clear(cart["id"])
-
         flash("¡Pedido realizado con éxito!", "success")
         return redirect(url_for("orders.my_orders"))
 
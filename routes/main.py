@@ -1,18 +1,34 @@
-from flask import Blueprint, render_template, request, url_for
-from models import Product, Category
+from flask import Blueprint, render_template, request, url_for, jsonify
+from models import Product, Category, PRODUCT_SORTS
+from extensions import gather
+from search_index import suggest_index
+from cache import cached_page
+from http_cache import http_cached
 
 main_bp = Blueprint('main', __name__)
 
+def _sort_arg():
+    # Unknown values fall back to the default order instead of erroring
+    sort = request.args.get('sort')
+    return sort if sort in PRODUCT_SORTS else None
+
 @main_bp.route('/')
+@http_cached()
+@cached_page
 def index():
     try:
-        categories = Category.get_all()
+        # Every category with its first products (single call), the offers
+        # strip and the bottom grid are independent, so fetch them concurrently
+        categories, offers_products, all_products = gather(
+            lambda: Product.top_n_per_category(4),
+            lambda: Product.filter({'is_offer': True}, limit=4),
+            lambda: Product.get_all(limit=20)
+        )
         
         # Build sections for Homepage
         category_sections = []
         
         # 1. Offers Section (Fake 'Offers' category for display)
-        offers_products = Product.filter({'is_offer': True}, limit=4)
         if offers_products:
             category_sections.append({
                 'title': 'Ofertas Destacadas',
@@ -21,25 +37,23 @@ def index():
                 'products': offers_products
             })
             
-        # 2. Per Category Sections (Limit to first 5 categories to avoid too many requests)
-        for cat in categories[:5]:
-            products = Product.filter({'category_id': cat['id']}, limit=4)
-            if products:
+        # 2. Per Category Sections
+        for cat in categories:
+            if cat['products']:
                 category_sections.append({
                     'title': cat['name'],
                     'id': cat['id'], # Helper for link construction if needed
                     'link': url_for('main.offers', category=cat['id']),
-                    'products': products
+                    'products': cat['products']
                 })
 
-        # Fallback products if sections are empty or just for the bottom grid
-        all_products = Product.get_all(limit=20)
-
         return render_template('index.html', category_sections=category_sections, categories=categories, products=all_products, title="Inicio")
     except Exception as e:
         return f"<h1>Error de Conexión a Supabase API</h1><p>{str(e)}</p>", 500
 
 @main_bp.route('/offers')
+@http_cached()
+@cached_page
 def offers():
     categories = Category.get_all()
     
@@ -55,10 +69,58 @@ def offers():
     # Clean filters (remove None or empty strings)
     filters = {k: v for k, v in filters.items() if v is not None and v != ''}
     
-    products = Product.filter(filters)
-    return render_template('index.html', products=products, categories=categories, title="Ofertas", show_filters=True)
+    sort = _sort_arg()
+
+    products, facets = gather(
+        lambda: Product.filter(filters, sort=sort),
+        lambda: Product.facets(filters)
+    )
+    return render_template('index.html', products=products, categories=categories, facets=facets, sorts=PRODUCT_SORTS, title="Ofertas", show_filters=True)
+
+@main_bp.route('/search')
+@http_cached()
+@cached_page
+def search():
+    categories = Category.get_all()
+    term = (request.args.get('search') or '').strip()
+
+    filters = {
+        'category_id': request.args.get('category'),
+        'min_price': request.args.get('min_price'),
+        'max_price': request.args.get('max_price'),
+        'search': term
+    }
+    filters = {k: v for k, v in filters.items() if v is not None and v != ''}
+    sort = _sort_arg()
+
+    products, facets = gather(
+        lambda: Product.filter(filters, limit=48, sort=sort),
+        lambda: Product.facets(filters)
+    )
+    title = f'Resultados para "{term}"' if term else 'Catálogo'
+    return render_template('index.html', products=products, categories=categories, facets=facets, sorts=PRODUCT_SORTS, title=title, show_filters=True)
+
+@main_bp.route('/search/suggest')
+@http_cached(max_age=60, per_user=False)
+def search_suggest():
+    # Answered from the in-process prefix index, never a Supabase call per keystroke
+    suggest_index.ensure_loaded(
+        lambda: (Product.iter_all('suggest'), Category.get_all())
+    )
+    query = request.args.get('q', '')
+    suggestions = []
+    for item in suggest_index.suggest(query):
+        if item['type'] == 'category':
+            item['url'] = url_for('main.search', category=item['id'])
+        else:
+            item['url'] = url_for('main.product_detail', id=item['id'])
+        suggestions.append(item)
+
+    return jsonify({'query': query, 'suggestions': suggestions})
 
 @main_bp.route('/product/<int:id>')
+@http_cached()
+@cached_page
 def product_detail(id):
     product = Product.get(id)
     if not product:
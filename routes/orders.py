@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, abort
+from flask import Blueprint, current_app, render_template, request, abort
 from flask_login import login_required, current_user
 from models import Order
 
@@ -7,8 +7,12 @@ orders_bp = Blueprint('orders', __name__)
 @orders_bp.route('/')
 @login_required
 def my_orders():
-    orders = Order.get_by_user(current_user.id)
-    return render_template('orders.html', orders=orders)
+    orders, next_cursor = Order.page_by_user(
+        current_user.id,
+        request.args.get('cursor'),
+        current_app.config['ORDERS_PAGE_SIZE']
+    )
+    return render_template('orders.html', orders=orders, next_cursor=next_cursor)
 
 @orders_bp.route('/<int:order_id>')
 @login_required
@@ -0,0 +1,166 @@
+import bisect
+import threading
+import time
+import unicodedata
+
+from cache import listing_version
+
+
+def normalize(text):
+    """Lowercase and strip accents so "Iluminación" matches "ilumina"."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def _words(text):
+    return [w for w in "".join(c if c.isalnum() else " " for c in text).split() if w]
+
+
+class PrefixIndex:
+    """In-process typeahead index over product and category names.
+
+    Every word of every name is kept in a sorted array of ``(word, id)``
+    tuples per kind, so a prefix lookup is a ``bisect`` plus a short scan
+    that stops as soon as ``limit`` names match. Writes update the arrays in
+    place; a full reload happens on first use and again once ``ttl``
+    seconds have passed.
+    """
+
+    # Scanned in this order; categories also rank first
+    KINDS = ("category", "product")
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._entries = {kind: [] for kind in self.KINDS}
+        self._docs = {}
+        self._terms = {}
+        self._loaded_at = None
+        self._version = None
+        self._rebuilding = False
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get("SUGGEST_INDEX_TTL", self.ttl)
+
+    def ensure_loaded(self, loader):
+        """Rebuild from ``loader()`` -> (products, categories) when stale.
+
+        Only one thread reloads; the others keep answering from the current
+        arrays (empty until the first load finishes).
+        """
+        version = listing_version.value
+        with self._lock:
+            if self._rebuilding or (
+                self._loaded_at is not None
+                and self._version == version
+                and time.monotonic() - self._loaded_at < self.ttl
+            ):
+                return
+            self._rebuilding = True
+        try:
+            docs, terms, entries = self._build(*loader())
+        except BaseException:
+            with self._lock:
+                self._rebuilding = False
+            raise
+        with self._lock:
+            # Tagged with the version read before loading, so a write made
+            # meanwhile triggers another rebuild instead of being lost
+            self._docs = docs
+            self._terms = terms
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+            self._version = version
+            self._rebuilding = False
+
+    def _build(self, products, categories):
+        docs = {}
+        for c in categories:
+            docs[("category", c["id"])] = {"label": c["name"]}
+        for p in products:
+            docs[("product", p["id"])] = {"label": p["name"], "price": p.get("price")}
+        terms = {key: _terms(doc["label"]) for key, doc in docs.items()}
+        entries = {kind: [] for kind in self.KINDS}
+        for (kind, id), (_, words) in terms.items():
+            entries[kind].extend((word, id) for word in set(words))
+        for kind_entries in entries.values():
+            kind_entries.sort()
+        return docs, terms, entries
+
+    def upsert(self, kind, id, label, **extra):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._remove(kind, id)
+            self._docs[(kind, id)] = {"label": label, **extra}
+            self._terms[(kind, id)] = _terms(label)
+            for word in set(self._terms[(kind, id)][1]):
+                bisect.insort(self._entries[kind], (word, id))
+            # Patched for our own write; don't rebuild for its version bump
+            self._version = listing_version.value
+
+    def remove(self, kind, id):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(kind, id)
+                self._version = listing_version.value
+
+    def _remove(self, kind, id):
+        self._docs.pop((kind, id), None)
+        terms = self._terms.pop((kind, id), None)
+        if terms is None:
+            return
+        entries = self._entries[kind]
+        for word in set(terms[1]):
+            i = bisect.bisect_left(entries, (word, id))
+            if i < len(entries) and entries[i] == (word, id):
+                del entries[i]
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def suggest(self, query, limit=8):
+        """Up to ``limit`` names with a word starting with each query term.
+
+        The scan stops at the first ``limit`` matches (categories first,
+        then products in word order); only those are ranked.
+        """
+        terms = _words(normalize(query))
+        if not terms:
+            return []
+        first, rest = terms[0], terms[1:]
+
+        matches = []
+        with self._lock:
+            for kind in self.KINDS:
+                entries = self._entries[kind]
+                seen = set()
+                i = bisect.bisect_left(entries, (first,))
+                while i < len(entries) and len(matches) < limit:
+                    word, id = entries[i]
+                    i += 1
+                    if not word.startswith(first):
+                        break
+                    if id in seen:
+                        continue
+                    seen.add(id)
+                    label, words = self._terms[(kind, id)]
+                    # Remaining terms must each prefix some word of the name
+                    if all(any(w.startswith(t) for w in words) for t in rest):
+                        matches.append((kind, id, label, self._docs[(kind, id)]))
+
+        phrase = " ".join(terms)
+        matches.sort(
+            key=lambda m: (m[0] != "category", not m[2].startswith(phrase), m[2])
+        )
+        return [{"type": kind, "id": id, **doc} for kind, id, _, doc in matches]
+
+
+def _terms(label):
+    """(normalized label, its words), computed once per name."""
+    text = normalize(label)
+    return text, _words(text)
+
+
+suggest_index = PrefixIndex()
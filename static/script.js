@@ -114,6 +114,66 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    // Search-as-you-type suggestions (answered from the server's in-memory index)
+    const suggestInput = document.querySelector('[data-suggest-input]');
+    const suggestList = document.querySelector('[data-suggest-list]');
+    if (suggestInput && suggestList) {
+        let debounceTimer = null;
+        let lastQuery = '';
+
+        const hideSuggestions = () => suggestList.classList.remove('active');
+
+        const renderSuggestions = suggestions => {
+            if (!suggestions.length) {
+                hideSuggestions();
+                return;
+            }
+            // Nodes built with textContent: labels come from product names
+            suggestList.replaceChildren(
+                ...suggestions.map(item => {
+                    const link = document.createElement('a');
+                    link.className = 'search-suggestion';
+                    link.href = item.url;
+                    const label = document.createElement('span');
+                    label.textContent = item.label;
+                    const hint = document.createElement('small');
+                    hint.textContent = item.type === 'category'
+                        ? 'Categoría'
+                        : `RD$ ${Number(item.price || 0).toFixed(2)}`;
+                    link.append(label, hint);
+                    return link;
+                })
+            );
+            suggestList.classList.add('active');
+        };
+
+        suggestInput.addEventListener('input', () => {
+            clearTimeout(debounceTimer);
+            const query = suggestInput.value.trim();
+            if (query.length < 2) {
+                hideSuggestions();
+                return;
+            }
+            debounceTimer = setTimeout(() => {
+                lastQuery = query;
+                fetch(`/search/suggest?q=${encodeURIComponent(query)}`)
+                    .then(response => response.json())
+                    .then(data => {
+                        if (data.query === lastQuery) {
+                            renderSuggestions(data.suggestions || []);
+                        }
+                    })
+                    .catch(() => {});
+            }, 120);
+        });
+
+        document.addEventListener('click', event => {
+            if (!suggestList.contains(event.target) && event.target !== suggestInput) {
+                hideSuggestions();
+            }
+        });
+    }
+
     // Simple hero slider (two images, 5s interval)
     const hero = document.querySelector('[data-hero-images]');
     if (hero) {
@@ -92,6 +92,360 @@ CREATE TABLE IF NOT EXISTS order_items (
     quantity INTEGER NOT NULL
 );
 
+-- 7.1 Índices para paginación por cursor (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_products_created_at_id ON products (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_created_at_id ON orders (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_user_created_at_id ON orders (user_id, created_at DESC, id DESC);
+-- Exportes por rango de fechas (ítems por orden, pagos por fecha)
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id_id ON order_items (order_id, id);
+CREATE INDEX IF NOT EXISTS idx_payments_created_at_id ON payments (created_at, id);
+
+-- 7.2 Índices para los órdenes del catálogo (precio, nombre, ofertas primero);
+-- terminan en id para servir también de cursor
+CREATE INDEX IF NOT EXISTS idx_products_price_id ON products (price, id);
+CREATE INDEX IF NOT EXISTS idx_products_name_id ON products (name, id);
+CREATE INDEX IF NOT EXISTS idx_products_offer_created_at_id ON products (is_offer DESC, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_products_category_price_id ON products (category_id, price, id);
+
+-- 8. Funciones (RPC)
+-- 8.1 Resumen de órdenes por estado para el dashboard (conteo e ingresos)
+CREATE OR REPLACE FUNCTION order_stats()
+RETURNS TABLE (status VARCHAR, orders BIGINT, revenue DECIMAL)
+LANGUAGE sql STABLE
+AS $$
+    SELECT COALESCE(o.status, 'pending'), COUNT(*), COALESCE(SUM(o.total_amount), 0)
+    FROM orders o
+    GROUP BY 1
+    ORDER BY 2 DESC;
+$$;
+
+-- 8.2 Carrito: sumar cantidad de forma atómica (un solo viaje, sin condiciones de carrera)
+CREATE OR REPLACE FUNCTION add_cart_item(p_cart_id UUID, p_product_id INTEGER, p_quantity INTEGER)
+RETURNS cart_items
+LANGUAGE sql
+AS $$
+    INSERT INTO cart_items (cart_id, product_id, quantity)
+    VALUES (p_cart_id, p_product_id, p_quantity)
+    ON CONFLICT ON CONSTRAINT unique_product_in_cart
+    DO UPDATE SET quantity = cart_items.quantity + EXCLUDED.quantity
+    RETURNING *;
+$$;
+
+-- 8.3 Carrito: crear el carrito del usuario (si no existe) y sumar el producto
+CREATE OR REPLACE FUNCTION add_user_cart_item(p_user_id UUID, p_product_id INTEGER, p_quantity INTEGER)
+RETURNS cart_items
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_cart_id UUID;
+BEGIN
+    INSERT INTO carts (user_id) VALUES (p_user_id)
+    ON CONFLICT ON CONSTRAINT unique_user_cart
+    DO UPDATE SET updated_at = CURRENT_TIMESTAMP
+    RETURNING id INTO v_cart_id;
+
+    RETURN add_cart_item(v_cart_id, p_product_id, p_quantity);
+END;
+$$;
+
+-- 8.4 Checkout transaccional: orden, ítems, envío, pago, descuento de stock y
+-- vaciado del carrito en una sola llamada. Cualquier error revierte todo.
+CREATE OR REPLACE FUNCTION checkout_cart(
+    p_user_id UUID,
+    p_shipping JSONB,
+    p_payment_method VARCHAR,
+    p_transaction_ref VARCHAR DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_cart_id UUID;
+    v_lines JSONB;
+    v_total DECIMAL(10, 2);
+    v_missing TEXT;
+    v_order orders;
+BEGIN
+    -- Bloquea el carrito: add_user_cart_item espera a que termine el checkout
+    SELECT id INTO v_cart_id FROM carts WHERE user_id = p_user_id FOR UPDATE;
+
+    -- Lee las líneas una sola vez, bloqueando ítems y productos; todo lo que
+    -- sigue usa esta copia, así total, ítems, stock y vaciado coinciden aunque
+    -- otra transacción modifique el carrito mientras tanto
+    SELECT jsonb_agg(to_jsonb(l)) INTO v_lines
+    FROM (
+        SELECT ci.id AS item_id, p.id AS product_id, p.name, p.price, p.stock, ci.quantity
+        FROM cart_items ci
+        JOIN products p ON p.id = ci.product_id
+        WHERE ci.cart_id = v_cart_id
+        ORDER BY p.id
+        FOR UPDATE OF p, ci
+    ) l;
+
+    IF v_lines IS NULL THEN
+        RAISE EXCEPTION 'empty_cart';
+    END IF;
+
+    SELECT string_agg(l.name, ', ') INTO v_missing
+    FROM jsonb_to_recordset(v_lines) AS l(name TEXT, stock INTEGER, quantity INTEGER)
+    WHERE l.stock < l.quantity;
+
+    IF v_missing IS NOT NULL THEN
+        RAISE EXCEPTION 'insufficient_stock: %', v_missing;
+    END IF;
+
+    SELECT SUM(l.price * l.quantity) INTO v_total
+    FROM jsonb_to_recordset(v_lines) AS l(price DECIMAL, quantity INTEGER);
+
+    INSERT INTO orders (user_id, total_amount, status)
+    VALUES (p_user_id, v_total, 'pending')
+    RETURNING * INTO v_order;
+
+    INSERT INTO order_items (order_id, product_id, product_name, quantity, price_at_purchase)
+    SELECT v_order.id, l.product_id, l.name, l.quantity, l.price
+    FROM jsonb_to_recordset(v_lines)
+        AS l(product_id INTEGER, name TEXT, price DECIMAL, quantity INTEGER);
+
+    UPDATE products p
+    SET stock = p.stock - l.quantity
+    FROM jsonb_to_recordset(v_lines) AS l(product_id INTEGER, quantity INTEGER)
+    WHERE p.id = l.product_id;
+
+    INSERT INTO order_shipping (order_id, full_name, address, city, phone, notes)
+    VALUES (
+        v_order.id,
+        p_shipping->>'full_name',
+        p_shipping->>'address',
+        p_shipping->>'city',
+        p_shipping->>'phone',
+        p_shipping->>'notes'
+    );
+
+    INSERT INTO payments (order_id, amount, method, status, transaction_ref)
+    VALUES (v_order.id, v_total, p_payment_method, 'paid', p_transaction_ref);
+
+    -- Solo las líneas compradas; una agregada después queda en el carrito
+    DELETE FROM cart_items ci
+    USING jsonb_to_recordset(v_lines) AS l(item_id INTEGER)
+    WHERE ci.id = l.item_id;
+
+    RETURN to_jsonb(v_order) || jsonb_build_object(
+        'items', (SELECT jsonb_agg(to_jsonb(oi)) FROM order_items oi WHERE oi.order_id = v_order.id),
+        'shipping', (SELECT to_jsonb(os) FROM order_shipping os WHERE os.order_id = v_order.id),
+        'payment', (SELECT to_jsonb(pm) FROM payments pm WHERE pm.order_id = v_order.id)
+    );
+END;
+$$;
+
+-- 9. Búsqueda de productos (texto completo en español, sin acentos, por prefijo)
+CREATE EXTENSION IF NOT EXISTS unaccent WITH SCHEMA extensions;
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
+
+-- unaccent() no es IMMUTABLE; este envoltorio permite usarlo en índices
+CREATE OR REPLACE FUNCTION f_unaccent(TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$
+    SELECT extensions.unaccent('extensions.unaccent', $1);
+$$;
+
+-- Vector de búsqueda: el nombre pesa más que la descripción
+CREATE OR REPLACE FUNCTION product_search_vector(p_name TEXT, p_description TEXT)
+RETURNS TSVECTOR
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT setweight(to_tsvector('spanish', f_unaccent(COALESCE(p_name, ''))), 'A')
+        || setweight(to_tsvector('spanish', f_unaccent(COALESCE(p_description, ''))), 'B');
+$$;
+
+-- Índices de expresión (no agregan columnas a select("*"))
+CREATE INDEX IF NOT EXISTS idx_products_search
+    ON products USING GIN (product_search_vector(name, description));
+CREATE INDEX IF NOT EXISTS idx_products_name_trgm
+    ON products USING GIN (f_unaccent(lower(name)) extensions.gin_trgm_ops);
+
+-- Cada palabra se busca por prefijo ("tala" encuentra "Taladro"); el trigrama
+-- tolera errores de tipeo en el nombre. Resultados ordenados por relevancia,
+-- salvo que p_sort pida otro orden ('newest', 'price_asc', 'price_desc',
+-- 'name', 'offers'); el límite se aplica después de ordenar.
+DROP FUNCTION IF EXISTS search_products(TEXT, INTEGER, DECIMAL, DECIMAL, BOOLEAN, INTEGER);
+CREATE OR REPLACE FUNCTION search_products(
+    p_query TEXT,
+    p_category_id INTEGER DEFAULT NULL,
+    p_min_price DECIMAL DEFAULT NULL,
+    p_max_price DECIMAL DEFAULT NULL,
+    p_is_offer BOOLEAN DEFAULT NULL,
+    p_limit INTEGER DEFAULT 48,
+    p_sort TEXT DEFAULT NULL
+)
+RETURNS SETOF products
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    v_text TEXT := f_unaccent(lower(COALESCE(p_query, '')));
+    v_tsquery TSQUERY;
+BEGIN
+    SELECT to_tsquery('spanish', string_agg(word || ':*', ' & '))
+    INTO v_tsquery
+    FROM regexp_split_to_table(trim(regexp_replace(v_text, '[^[:alnum:]]+', ' ', 'g')), ' ') AS word
+    WHERE word <> '';
+
+    IF v_tsquery IS NULL THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT p.*
+    FROM products p
+    WHERE (
+            product_search_vector(p.name, p.description) @@ v_tsquery
+            OR f_unaccent(lower(p.name)) OPERATOR(extensions.%) v_text
+        )
+        AND (p_category_id IS NULL OR p.category_id = p_category_id)
+        AND (p_min_price IS NULL OR p.price >= p_min_price)
+        AND (p_max_price IS NULL OR p.price <= p_max_price)
+        AND (p_is_offer IS NULL OR p.is_offer = p_is_offer)
+    ORDER BY
+        CASE WHEN p_sort = 'price_asc' THEN p.price END ASC,
+        CASE WHEN p_sort = 'price_desc' THEN p.price END DESC,
+        CASE WHEN p_sort = 'name' THEN p.name END ASC,
+        CASE WHEN p_sort = 'offers' THEN p.is_offer END DESC,
+        CASE WHEN p_sort IN ('newest', 'offers') THEN p.created_at END DESC,
+        ts_rank(product_search_vector(p.name, p.description), v_tsquery)
+            + extensions.similarity(f_unaccent(lower(p.name)), v_text) DESC,
+        p.id
+    LIMIT p_limit;
+END;
+$$;
+
+-- 10. Facetas del filtro de catálogo: conteos por categoría y por rango de precio
+-- en una sola llamada. Cada faceta ignora su propio filtro (las categorías
+-- respetan el precio y los rangos de precio respetan la categoría).
+CREATE OR REPLACE FUNCTION product_facets(
+    p_query TEXT DEFAULT NULL,
+    p_category_id INTEGER DEFAULT NULL,
+    p_min_price DECIMAL DEFAULT NULL,
+    p_max_price DECIMAL DEFAULT NULL,
+    p_is_offer BOOLEAN DEFAULT NULL,
+    p_bands DECIMAL[] DEFAULT ARRAY[500, 1000, 2500, 5000, 10000]
+)
+RETURNS JSONB
+LANGUAGE sql STABLE
+AS $$
+    WITH matched AS (
+        SELECT p.category_id, p.price
+        FROM products p
+        WHERE COALESCE(p_query, '') = ''
+            AND (p_is_offer IS NULL OR p.is_offer = p_is_offer)
+        UNION ALL
+        SELECT s.category_id, s.price
+        FROM search_products(p_query, NULL, NULL, NULL, p_is_offer, 2147483647) s
+        WHERE COALESCE(p_query, '') <> ''
+    ),
+    counted AS (
+        SELECT
+            category_id,
+            width_bucket(price, p_bands) AS band,
+            COUNT(*) FILTER (
+                WHERE (p_min_price IS NULL OR price >= p_min_price)
+                    AND (p_max_price IS NULL OR price <= p_max_price)
+            ) AS in_price,
+            COUNT(*) FILTER (
+                WHERE p_category_id IS NULL OR category_id = p_category_id
+            ) AS in_category
+        FROM matched
+        GROUP BY category_id, band
+    )
+    SELECT jsonb_build_object(
+        'categories', COALESCE((
+            SELECT jsonb_object_agg(COALESCE(category_id::TEXT, ''), n)
+            FROM (SELECT category_id, SUM(in_price) AS n FROM counted GROUP BY category_id) c
+            WHERE n > 0
+        ), '{}'::JSONB),
+        'bands', COALESCE((
+            SELECT jsonb_object_agg(band::TEXT, n)
+            FROM (SELECT band, SUM(in_category) AS n FROM counted GROUP BY band) b
+            WHERE n > 0
+        ), '{}'::JSONB)
+    );
+$$;
+
+-- 11. Ajustes masivos del catálogo: precio (porcentaje, monto o valor fijo),
+-- stock (sumar o fijar) y oferta para todos los productos que cumplen el filtro,
+-- en un solo UPDATE. Con p_dry_run solo cuenta los productos que cambiarían.
+-- Precio y stock nunca quedan negativos. El texto se busca solo por prefijo de
+-- palabra, como el tsquery de search_products pero sin el trigrama, para no
+-- modificar productos con nombres parecidos. Devuelve {"count", "sample"}, con
+-- hasta 10 nombres afectados para revisar antes de aplicar.
+DROP FUNCTION IF EXISTS bulk_adjust_products(TEXT, INTEGER, DECIMAL, DECIMAL, BOOLEAN, TEXT, DECIMAL, TEXT, INTEGER, BOOLEAN, BOOLEAN);
+CREATE OR REPLACE FUNCTION bulk_adjust_products(
+    p_query TEXT DEFAULT NULL,
+    p_category_id INTEGER DEFAULT NULL,
+    p_min_price DECIMAL DEFAULT NULL,
+    p_max_price DECIMAL DEFAULT NULL,
+    p_is_offer BOOLEAN DEFAULT NULL,
+    p_price_mode TEXT DEFAULT NULL,      -- 'percent', 'amount' o 'set'
+    p_price_value DECIMAL DEFAULT NULL,
+    p_stock_mode TEXT DEFAULT NULL,      -- 'add' o 'set'
+    p_stock_value INTEGER DEFAULT NULL,
+    p_set_offer BOOLEAN DEFAULT NULL,
+    p_dry_run BOOLEAN DEFAULT TRUE
+)
+RETURNS JSONB
+LANGUAGE sql
+AS $$
+    WITH search AS (
+        SELECT to_tsquery('spanish', string_agg(word || ':*', ' & ')) AS tsquery
+        FROM regexp_split_to_table(
+            trim(regexp_replace(f_unaccent(lower(COALESCE(p_query, ''))), '[^[:alnum:]]+', ' ', 'g')),
+            ' '
+        ) AS word
+        WHERE word <> ''
+    ),
+    targets AS (
+        SELECT p.id, p.name
+        FROM products p, search s
+        WHERE (p_category_id IS NULL OR p.category_id = p_category_id)
+            AND (p_min_price IS NULL OR p.price >= p_min_price)
+            AND (p_max_price IS NULL OR p.price <= p_max_price)
+            AND (p_is_offer IS NULL OR p.is_offer = p_is_offer)
+            -- Un texto sin palabras (solo signos) no selecciona nada
+            AND (
+                COALESCE(p_query, '') = ''
+                OR product_search_vector(p.name, p.description) @@ s.tsquery
+            )
+    ),
+    updated AS (
+        UPDATE products p
+        SET price = GREATEST(0, CASE p_price_mode
+                WHEN 'percent' THEN ROUND(p.price * (1 + p_price_value / 100), 2)
+                WHEN 'amount' THEN p.price + p_price_value
+                WHEN 'set' THEN p_price_value
+                ELSE p.price
+            END),
+            stock = GREATEST(0, CASE p_stock_mode
+                WHEN 'add' THEN COALESCE(p.stock, 0) + p_stock_value
+                WHEN 'set' THEN p_stock_value
+                ELSE p.stock
+            END),
+            is_offer = COALESCE(p_set_offer, p.is_offer)
+        FROM targets t
+        WHERE p.id = t.id AND NOT p_dry_run
+        RETURNING p.id
+    )
+    SELECT jsonb_build_object(
+        'count', CASE WHEN p_dry_run
+            THEN (SELECT COUNT(*) FROM targets)
+            ELSE (SELECT COUNT(*) FROM updated)
+        END,
+        'sample', COALESCE((
+            SELECT jsonb_agg(name ORDER BY name)
+            FROM (SELECT name FROM targets ORDER BY name LIMIT 10) t
+        ), '[]'::JSONB)
+    );
+$$;
+
 -- DATOS DE EJEMPLO (SEED DATA)
 -- Categorías
 INSERT INTO categories (name, slug) VALUES 
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import httpx
+
+# Only requests that are safe to repeat are retried on a gateway error;
+# connection failures are retried for every method since nothing was sent.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUSES = {502, 503, 504}
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class _ObservedStream(httpx.SyncByteStream):
+    """Response body that reports its size once the client has read it."""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._bytes = 0
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._bytes += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close(self._bytes)
+
+
+class PooledTransport(httpx.BaseTransport):
+    """Keep-alive connection pool with retries, backoff and usage counters.
+
+    Callables added with ``add_listener`` are called as
+    ``listener(request, response, seconds, nbytes)`` once each final
+    response body has been read, in the thread that made the call.
+    """
+
+    def __init__(self, retries=2, backoff=0.1, **kwargs):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = kwargs["limits"].max_connections
+        self._transport = httpx.HTTPTransport(**kwargs)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+        }
+
+    def _track(self, name, delta=1):
+        with self._lock:
+            self._counters[name] += delta
+            if name == "in_flight":
+                self._counters["peak_in_flight"] = max(
+                    self._counters["peak_in_flight"], self._counters["in_flight"]
+                )
+
+    def add_listener(self, listener):
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _observe(self, request, response, started):
+        def report(nbytes):
+            elapsed = time.perf_counter() - started
+            for listener in self._listeners:
+                listener(request, response, elapsed, nbytes)
+
+        if hasattr(response, "_content"):
+            # Already-buffered bodies (e.g. test transports) are never re-read
+            report(len(response.content))
+        else:
+            response.stream = _ObservedStream(response.stream, report)
+        return response
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            self._track("requests")
+            self._track("in_flight")
+            try:
+                response = self._transport.handle_request(request)
+            except CONNECT_ERRORS:
+                self._track("errors")
+                if attempt >= self.retries:
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or request.method not in IDEMPOTENT_METHODS
+                    or attempt >= self.retries
+                ):
+                    if self._listeners:
+                        return self._observe(request, response, started)
+                    return response
+                response.close()
+            finally:
+                self._track("in_flight", -1)
+
+            self._track("retries")
+            time.sleep(self.backoff * (2**attempt))
+            attempt += 1
+
+    def close(self):
+        self._transport.close()
+
+    def stats(self):
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update(
+            {
+                "max_connections": self.max_connections,
+                "open_connections": len(connections),
+                "idle_connections": idle,
+                "utilization": (
+                    (len(connections) - idle) / self.max_connections
+                    if self.max_connections
+                    else 0
+                ),
+            }
+        )
+        return stats
+
+
+def build_http_client(config):
+    """Shared httpx client for the Supabase SDK, tuned from ``Config``."""
+    transport = PooledTransport(
+        retries=config.SUPABASE_RETRIES,
+        backoff=config.SUPABASE_RETRY_BACKOFF,
+        http2=config.SUPABASE_HTTP2,
+        limits=httpx.Limits(
+            max_connections=config.SUPABASE_POOL_SIZE,
+            max_keepalive_connections=config.SUPABASE_KEEPALIVE,
+            keepalive_expiry=config.SUPABASE_KEEPALIVE_EXPIRY,
+        ),
+    )
+    timeout = httpx.Timeout(
+        config.SUPABASE_READ_TIMEOUT,
+        connect=config.SUPABASE_CONNECT_TIMEOUT,
+        pool=config.SUPABASE_CONNECT_TIMEOUT,
+    )
+    client = httpx.Client(transport=transport, timeout=timeout, follow_redirects=True)
+    return client, transport